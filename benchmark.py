@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# benchmark.py — 性能基准：用与 cards.cdb 相同表结构的合成数据库测热点路径
+#
+#   python benchmark.py guess             # 单次猜测的标签解码 / 对比耗时
+#   python benchmark.py app               # 进程内 test client 跑完整游戏流程
+#   python benchmark.py http              # 子进程启动服务，本地 HTTP 压测
+#   python benchmark.py http --url http://127.0.0.1:5000 --db cards.cdb
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from map import SETNAME_MAP, TYPE_LINK, TYPE_PENDULUM
+
+NAME_CHARS = "龙之战士魔法师黑暗光明青眼白究极神圣骑士天使恶魔机械电子英雄元素幻影银河超量同调融合仪式灵摆连接星尘红莲混沌破坏剑闪刀姬"
+
+
+def make_synthetic_cdb(path, n_cards=13000, seed=0):
+    """
+    生成一个和 ygopro cards.cdb 表结构相同（datas/texts + hot 列）的合成数据库。
+    卡片类型、攻守、等级、效果位、系列码的分布大致贴近真实卡池。
+    """
+    rnd = random.Random(seed)
+    setcodes = list(SETNAME_MAP)
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(str(path))
+    cur = conn.cursor()
+    cur.execute(
+        "CREATE TABLE datas(id integer primary key, ot integer, alias integer, setcode integer,"
+        " type integer, atk integer, def integer, level integer, race integer,"
+        " attribute integer, category integer, hot INTEGER DEFAULT 0)"
+    )
+    cur.execute(
+        "CREATE TABLE texts(id integer primary key, name text, desc text, str1 text, str2 text,"
+        " str3 text, str4 text, str5 text, str6 text, str7 text, str8 text, str9 text,"
+        " str10 text, str11 text, str12 text, str13 text, str14 text, str15 text, str16 text)"
+    )
+    datas, texts = [], []
+    for i in range(n_cards):
+        card_id = 10000000 + i * 37
+        if rnd.random() < 0.6:
+            card_type = 0x1 | rnd.choice([
+                0x10, 0x20, 0x20 | 0x40, 0x20 | 0x80, 0x20 | 0x2000, 0x20 | 0x1000,
+                0x20 | 0x800000, 0x20 | TYPE_PENDULUM, 0x20 | TYPE_LINK,
+            ])
+            atk = rnd.randrange(0, 4100, 50)
+            if card_type & TYPE_LINK:
+                defense = sum(b for b in (0x1, 0x2, 0x4, 0x8, 0x20, 0x40, 0x80, 0x100) if rnd.random() < 0.3) or 0x2
+                level = rnd.randint(1, 6)
+            else:
+                defense = rnd.randrange(0, 3100, 50)
+                level = rnd.randint(1, 12)
+            if card_type & TYPE_PENDULUM:
+                scale = rnd.randint(0, 13)
+                level |= (scale << 24) | (scale << 16)
+            race = 1 << rnd.randrange(26)
+            attribute = 1 << rnd.randrange(7)
+        else:
+            card_type = rnd.choice([0x2, 0x2 | 0x10000, 0x2 | 0x20000, 0x2 | 0x80000,
+                                    0x4, 0x4 | 0x20000, 0x4 | 0x100000])
+            atk = defense = level = race = attribute = 0
+        category = sum(1 << b for b in range(32) if rnd.random() < 0.08)
+        setcode = 0
+        for k in range(rnd.choice([0, 0, 1, 1, 2])):
+            setcode |= rnd.choice(setcodes) << (16 * k)
+        name = "".join(rnd.choice(NAME_CHARS) for _ in range(rnd.randint(2, 9)))
+        if rnd.random() < 0.05:
+            name = f"No.{rnd.randint(1, 107)} {name}"
+        hot = int(card_type & 0x1 and rnd.random() < 0.05)
+        datas.append((card_id, 3, 0, setcode, card_type, atk, defense, level, race, attribute, category, hot))
+        texts.append((card_id, name, "") + ("",) * 16)
+    cur.executemany("INSERT INTO datas VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", datas)
+    cur.executemany("INSERT INTO texts VALUES (" + ",".join("?" * 19) + ")", texts)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def percentiles(samples):
+    """返回 (p50, p95, p99)，单位与输入相同"""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+def report(label, samples_s):
+    p50, p95, p99 = percentiles(samples_s)
+    mean = statistics.fmean(samples_s)
+    print(f"{label:<28} mean {mean * 1e6:9.1f}us  p50 {p50 * 1e6:9.1f}us  "
+          f"p95 {p95 * 1e6:9.1f}us  p99 {p99 * 1e6:9.1f}us")
+
+
+def bench_guess(db_path, rounds=2000, seed=0):
+    """
+    单次猜测的耗时：旧路径逐行 card_to_tags + 按卡名回查历史，
+    新路径直接查 build_tag_table 预先算好的标签表。
+    """
+    from data_utils import load_card_database, card_to_tags, compare_tags, build_tag_table
+
+    db = load_card_database(db_path)
+    t0 = time.perf_counter()
+    table = build_tag_table(db)
+    print(f"build_tag_table: {len(table)} 张卡，{(time.perf_counter() - t0) * 1e3:.1f}ms")
+
+    rnd = random.Random(seed)
+    ids = db.index.tolist()
+    cases = [(rnd.choice(ids), [rnd.choice(ids) for _ in range(2)]) for _ in range(rounds)]
+
+    def old_guess(target_id, guess_ids):
+        target = db.loc[target_id]
+        guess = db.loc[guess_ids[-1]]
+        compare_tags(card_to_tags(guess), card_to_tags(target))
+        # 第二次猜测的提示：对每条历史按卡名回查再解码
+        guessed = set()
+        for gid in guess_ids:
+            name = db.loc[gid, "name"]
+            row = db[db["name"] == name].iloc[0]
+            guessed |= set(card_to_tags(row)["效果标签"])
+        return set(card_to_tags(target)["效果标签"]) - guessed
+
+    def new_guess(target_id, guess_ids):
+        target = table[target_id]
+        compare_tags(table[guess_ids[-1]], target)
+        guessed = set()
+        for gid in guess_ids:
+            guessed |= set(table[gid]["效果标签"])
+        return set(target["效果标签"]) - guessed
+
+    for label, fn in (("guess (card_to_tags)", old_guess), ("guess (tag table)", new_guess)):
+        samples = []
+        for target_id, guess_ids in cases:
+            t0 = time.perf_counter()
+            fn(target_id, guess_ids)
+            samples.append(time.perf_counter() - t0)
+        report(label, samples)
+
+
+# ---------- HTTP 接口基准 ----------
+
+class LatencyLog:
+    """按接口汇总每个请求的耗时，线程安全"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok=True):
+        with self._lock:
+            entry = self.samples.setdefault(endpoint, {"times": [], "errors": 0})
+            entry["times"].append(seconds)
+            entry["errors"] += not ok
+
+    def print_report(self, wall_seconds):
+        print(f"{'endpoint':<16}{'count':>8}{'err':>6}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+        total = 0
+        for endpoint, entry in sorted(self.samples.items()):
+            times = entry["times"]
+            total += len(times)
+            p50, p95, p99 = percentiles(times)
+            print(f"{endpoint:<16}{len(times):>8}{entry['errors']:>6}{len(times) / wall_seconds:>10.1f}"
+                  f"{p50 * 1e3:>10.2f}{p95 * 1e3:>10.2f}{p99 * 1e3:>10.2f}")
+        print(f"合计 {total} 个请求，{wall_seconds:.2f}s，{total / wall_seconds:.1f} req/s")
+
+
+class TestClientUser:
+    """通过 Flask test client 在进程内发请求"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path, params=None):
+        return self.client.get(path, query_string=params).status_code
+
+    def post(self, path, data=None, json=None):
+        return self.client.post(path, data=data, json=json).status_code
+
+    def get_json(self, path, params=None):
+        return self.client.get(path, query_string=params).get_json()
+
+
+class HttpUser:
+    """通过真实 HTTP 连接发请求，每个虚拟玩家一个带 cookie 的 Session"""
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def get(self, path, params=None):
+        return self.session.get(self.base_url + path, params=params, allow_redirects=False).status_code
+
+    def post(self, path, data=None, json=None):
+        return self.session.post(self.base_url + path, data=data, json=json, allow_redirects=False).status_code
+
+    def get_json(self, path, params=None):
+        return self.session.get(self.base_url + path, params=params).json()
+
+
+def play_session(user, names, log, rnd, games=3, guesses=6, modes=("hot", "monster", "all")):
+    """
+    模拟一个玩家：开局 → 每次猜测前逐字输入触发 /suggest → 提交猜测，
+    中途随机投降或重新开始，再用 JSON 接口猜一次。
+    """
+    def timed(endpoint, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        status = fn(*args, **kwargs)
+        log.add(endpoint, time.perf_counter() - t0, ok=status < 400)
+        return status
+
+    for _ in range(games):
+        timed("start", user.post, "/", data={"mode": rnd.choice(modes), "attempts": "10"})
+        timed("game GET", user.get, "/game")
+        for _ in range(guesses):
+            name = rnd.choice(names)
+            # 一次按键一个 /suggest 请求
+            for i in range(1, min(len(name), 4) + 1):
+                t0 = time.perf_counter()
+                suggestions = user.get_json("/suggest", {"q": name[:i]})
+                log.add("suggest", time.perf_counter() - t0)
+            guess = rnd.choice(suggestions) if suggestions else name
+            timed("game guess", user.post, "/game", data={"action": "guess", "guess": guess})
+        timed("api guess", user.post, "/api/guess", json={"guess": rnd.choice(names)})
+        if rnd.random() < 0.5:
+            timed("surrender", user.post, "/game", data={"action": "surrender"})
+        else:
+            timed("restart", user.post, "/game", data={"action": "restart"})
+
+
+def run_load(make_user, names, users, games, seed=0):
+    log = LatencyLog()
+
+    def worker(i):
+        play_session(make_user(), names, log, random.Random(seed + i), games=games)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log.print_report(time.perf_counter() - t0)
+
+
+def bench_app(db_path, users, games):
+    """进程内：直接 import guess_card_game，用 test client 跑完整流程"""
+    os.environ["CARDS_DB"] = str(db_path)
+    from guess_card_game import app, store
+
+    names = store.pool("all").table["name"].tolist()
+    run_load(lambda: TestClientUser(app), names, users, games)
+
+
+def bench_http(db_path, users, games, url=None, port=5057):
+    """
+    本地 HTTP 压测：不传 url 时用合成数据库在子进程里启动 guess_card_game.py，
+    传入 url 时直接压已经在运行的服务（此时卡名从 db_path 读取）。
+    """
+    from data_utils import load_card_database
+
+    names = load_card_database(db_path, use_snapshot=False)["name"].tolist()
+    server = None
+    if url is None:
+        url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, CARDS_DB=str(db_path), PORT=str(port), CARDS_PRELOAD="1")
+        server = subprocess.Popen(
+            [sys.executable, str(Path(__file__).parent / "guess_card_game.py")],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        _wait_for_server(url, server)
+    try:
+        run_load(lambda: HttpUser(url), names, users, games)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def _wait_for_server(url, proc, timeout=60):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("服务进程启动失败")
+        try:
+            requests.get(url + "/", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"等待服务启动超时：{url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="游戏王CCB 性能基准")
+    parser.add_argument("suite", choices=["guess", "app", "http"],
+                        help="guess：单次猜测微基准；app：进程内 test client；http：本地 HTTP 压测")
+    parser.add_argument("--db", help="使用已有的 cards.cdb，默认生成合成数据库")
+    parser.add_argument("--cards", type=int, default=13000, help="合成数据库的卡片数量")
+    parser.add_argument("--rounds", type=int, default=2000, help="guess：猜测次数")
+    parser.add_argument("--users", type=int, default=8, help="app/http：并发虚拟玩家数")
+    parser.add_argument("--games", type=int, default=5, help="app/http：每个玩家玩几局")
+    parser.add_argument("--url", help="http：压测已经运行的服务，例如 http://127.0.0.1:5000")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or make_synthetic_cdb(Path(tmp) / "cards.cdb", args.cards)
+        if args.suite == "guess":
+            bench_guess(db_path, args.rounds)
+        elif args.suite == "app":
+            bench_app(db_path, args.users, args.games)
+        else:
+            bench_http(db_path, args.users, args.games, args.url)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ from pathlib import Path
 ENTRY_SCRIPT = "guess_card_game.py"
 # 要打包的数据库文件
 DB_FILE = "cards.cdb"
+# 数据库的列式快照（由 snapshot.py 生成），启动时免去 SQLite 读取
+SNAPSHOT_DIR = "cards.snapshot"
 # 要打包的模板目录
 TEMPLATE_DIR = "templates"
 # 输出目录
@@ -21,9 +23,10 @@ SPEC_FILE = ENTRY_SCRIPT.replace(".py", ".spec")
 # UPX 可执行文件所在路径（Windows 下一般安装在 C:\Program Files\upx-5.0.0-win64）
 UPX_DIR = r"C:\Program Files\upx-5.0.0-win64"
 # 要排除的模块列表
+# 运行时只从快照或 sqlite3 读卡表（CardTable），pandas 只有离线脚本用到，不打进可执行文件
 EXCLUDE_MODULES = [
     "tkinter", "pytest", "unittest", "pdb",
-    "numpy.tests", "pandas.tests",
+    "numpy.tests", "pandas",
 ]
 # =============================
 
@@ -43,14 +46,17 @@ def main():
             else:
                 p.unlink()
 
-    # 2. 检查 UPX
+    # 2. 生成最新的卡表快照
+    run([sys.executable, "snapshot.py", DB_FILE])
+
+    # 3. 检查 UPX
     if not Path(UPX_DIR).exists():
         print(f"[!] 没找到 UPX：{UPX_DIR}，将跳过 UPX 压缩")
         upx_arg = []
     else:
         upx_arg = ["--upx-dir", UPX_DIR]
 
-    # 3. 构造 PyInstaller 命令
+    # 4. 构造 PyInstaller 命令
     cmd = [
         sys.executable, "-m", "PyInstaller",
         "--onefile",
@@ -58,23 +64,24 @@ def main():
         *upx_arg,
     ]
 
-    # 3.1 把 cards.cdb 和 templates 目录都加入到可执行文件数据区
+    # 4.1 把 cards.cdb、快照和 templates 目录都加入到可执行文件数据区
     #    os.pathsep 在 Windows 下是 ';'，在 macOS/Linux 下是 ':'
     data_entries = [
         f"{DB_FILE}{os.pathsep}.",
+        f"{SNAPSHOT_DIR}{os.pathsep}{SNAPSHOT_DIR}",
         f"{TEMPLATE_DIR}{os.pathsep}{TEMPLATE_DIR}",
     ]
     for entry in data_entries:
         cmd += ["--add-data", entry]
 
-    # 3.2 排除不需要的模块
+    # 4.2 排除不需要的模块
     for mod in EXCLUDE_MODULES:
         cmd += ["--exclude-module", mod]
 
-    # 3.3 最后加上入口脚本
+    # 4.3 最后加上入口脚本
     cmd += [ENTRY_SCRIPT]
 
-    # 4. 运行打包
+    # 5. 运行打包
     run(cmd)
     print("\n✅ 打包完成！可执行文件在", Path(DIST_DIR) / Path(ENTRY_SCRIPT).stem)
 
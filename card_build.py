@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 # mark_hot_cards.py
+#
+#   python card_build.py                       # 从 API 拉取本月热门卡
+#   python card_build.py --json hot.json       # 使用离线保存的 API 响应
+#   python card_build.py --diff hot_diff.json  # 把变化的卡片 id 写到文件，供运行中的服务增量应用
 
-import requests
+import argparse
+import json
 import sqlite3
 import sys
 
@@ -14,11 +19,20 @@ PARAMS = {
 }
 DB_PATH = "cards.cdb"
 
-def fetch_hot_names():
+def fetch_hot_payload():
+    import requests
+
     print("🔄 正在从 API 获取本月热门卡牌数据……")
     resp = requests.get(API_URL, params=PARAMS, timeout=10)
     resp.raise_for_status()
-    data = resp.json()
+    return resp.json()
+
+def load_hot_payload(path):
+    print(f"🔄 正在读取离线热门卡数据：{path}")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def parse_hot_names(data):
     hot_names = []
     # API 返回示例：{ "monster": [...], "spell": [...], "trap": [...] }
     for category, items in data.items():
@@ -41,43 +55,85 @@ def ensure_hot_column(cur):
     else:
         print("ℹ️ 字段 hot 已存在，跳过添加")
 
+def ensure_name_index(cur):
+    # 按卡名连接 texts 时走索引，不再逐行扫描
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_texts_name ON texts(name);")
+
 def mark_hot_cards(conn, hot_names):
-    cur = conn.cursor()
-    update_sql = """
-    UPDATE datas
-       SET hot = 1
-     WHERE id IN (
-       SELECT id FROM texts WHERE name = ?
-     );
     """
+    在一个事务里把热门卡设为 hot=1、其余设为 hot=0：
+    卡名先批量写进临时表，再与 texts 连接得到新的热门 id 集合，最后一条 UPDATE 只改动变化的行。
+    返回 (新增热门 id, 取消热门 id)。
+    """
+    cur = conn.cursor()
     print(f"🔄 开始将 {len(hot_names)} 张热门卡标记为 hot=1 …")
-    for name in hot_names:
-        cur.execute(update_sql, (name,))
+    cur.execute("DROP TABLE IF EXISTS temp.hot_names;")
+    cur.execute("DROP TABLE IF EXISTS temp.hot_ids;")
+    cur.execute("CREATE TEMP TABLE hot_names (name TEXT PRIMARY KEY);")
+    cur.executemany("INSERT OR IGNORE INTO temp.hot_names (name) VALUES (?);", ((n,) for n in hot_names))
+    cur.execute("""
+    CREATE TEMP TABLE hot_ids AS
+    SELECT DISTINCT t.id AS id
+      FROM texts t
+      JOIN temp.hot_names h ON h.name = t.name;
+    """)
+
+    cur.execute("SELECT id FROM temp.hot_ids WHERE id NOT IN (SELECT id FROM datas WHERE hot = 1) ORDER BY id;")
+    added = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT id FROM datas WHERE hot = 1 AND id NOT IN (SELECT id FROM temp.hot_ids) ORDER BY id;")
+    removed = [r[0] for r in cur.fetchall()]
+
+    # 同时清掉上个月遗留的 hot 标记
+    cur.execute("""
+    UPDATE datas
+       SET hot = (id IN (SELECT id FROM temp.hot_ids))
+     WHERE hot IS NOT (id IN (SELECT id FROM temp.hot_ids));
+    """)
     conn.commit()
+
+    missing = len(hot_names) - cur.execute(
+        "SELECT COUNT(*) FROM temp.hot_names h WHERE EXISTS (SELECT 1 FROM texts t WHERE t.name = h.name);"
+    ).fetchone()[0]
     cur.execute("SELECT COUNT(*) FROM datas WHERE hot=1;")
     count = cur.fetchone()[0]
-    print(f"✅ 完成！共有 {count} 张卡标记为热门。")
+    print(f"✅ 完成！共有 {count} 张卡标记为热门（新增 {len(added)}，取消 {len(removed)}）。")
+    if missing:
+        print(f"⚠️ 有 {missing} 个卡名在数据库里找不到")
+    return added, removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="刷新 cards.cdb 里的热门卡标记")
+    parser.add_argument("--db", default=DB_PATH, help="卡片数据库路径")
+    parser.add_argument("--json", help="离线的 API 响应文件，不指定则在线获取")
+    parser.add_argument("--diff", help="把 {added, removed} 变化的卡片 id 写到这个 JSON 文件")
+    args = parser.parse_args(argv)
 
-def main():
     try:
-        hot_names = fetch_hot_names()
+        data = load_hot_payload(args.json) if args.json else fetch_hot_payload()
     except Exception as e:
         print(f"❌ 获取热门卡失败：{e}", file=sys.stderr)
         sys.exit(1)
+    hot_names = parse_hot_names(data)
 
     print("🔎 本月热门卡（共 %d 张）：" % len(hot_names))
     print(", ".join(hot_names))
 
-    print(f"🔄 打开数据库：{DB_PATH}")
-    conn = sqlite3.connect(DB_PATH)
+    print(f"🔄 打开数据库：{args.db}")
+    conn = sqlite3.connect(args.db)
     cur = conn.cursor()
 
     ensure_hot_column(cur)
+    ensure_name_index(cur)
     conn.commit()
 
-    mark_hot_cards(conn, hot_names)
+    added, removed = mark_hot_cards(conn, hot_names)
 
     conn.close()
 
+    if args.diff:
+        with open(args.diff, "w", encoding="utf-8") as f:
+            json.dump({"added": added, "removed": removed}, f)
+        print(f"📝 变化的卡片 id 已写入 {args.diff}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,268 @@
+import os
+import random
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+import startup
+from card_table import CardTable
+from data_utils import build_tag_table, compare_cards, decode_card_columns, render_compare
+from fuzzy_index import FuzzyIndex
+from hints import DISTRACTOR_MODES, HINT_DISTRACTORS, choose_hint
+from name_index import NameIndex
+from sampling import AliasTable, Strata, pool_weights, stratum_keys
+from similarity import SimilarityIndex
+from solver import CandidateSolver
+
+MODES = ('monster', 'spell', 'trap', 'hot', 'all', 'easy', 'hard')
+# 没有单独建题库、借用其他题库的模式：每日一题从 DAILY_POOL 里出题，也只能猜这个题库里的卡
+MODE_ALIASES = {'daily': os.getenv("DAILY_POOL", 'hot')}
+# 题库为空时改用的题库：还没有算过难度时 easy / hard 为空，热门卡全被取消或 DAILY_POOL 筛不出卡时
+# 热门题库为空；不在这里的按 'all' 处理
+MODE_FALLBACKS = {'easy': 'hot', 'hard': 'all'}
+# 只用来出题的题库 → 玩家能猜的题库：easy / hard 的难度范围玩家看不见，
+# 猜测、联想、候选集合和接近度都按全部卡片算，猜一张范围外的真卡不会被当成“找不到”
+GUESS_POOLS = {'easy': 'all', 'hard': 'all'}
+# easy / hard 题库的难度上下界（difficulty.py 算出的期望猜测次数）
+DIFFICULTY_EASY_MAX = float(os.getenv("DIFFICULTY_EASY_MAX", 4))
+DIFFICULTY_HARD_MIN = float(os.getenv("DIFFICULTY_HARD_MIN", 8))
+# 缓存多少组 (猜测, 答案) 的对比判定和渲染结果，用于按需重新渲染历史记录
+COMPARE_CACHE_SIZE = int(os.getenv("COMPARE_CACHE_SIZE", 8192))
+
+
+def mode_mask(df, mode):
+    """
+    mode: 'monster' | 'spell' | 'trap' | 'hot' | 'all' | 'easy' | 'hard'
+    返回对应题库的布尔掩码（numpy 数组）
+    """
+    card_type = np.asarray(df['type'])
+    if mode == 'monster':
+        # 怪兽卡 & 排除通常怪兽
+        return ((card_type & 0x1) > 0) & ((card_type & 0x10) == 0)
+    if mode == 'spell':
+        return (card_type & 0x2) > 0
+    if mode == 'trap':
+        return (card_type & 0x4) > 0
+    if mode == 'hot':
+        hot = np.asarray(df['hot'])
+        return ((card_type & 0x1) > 0) & ((card_type & 0x10) == 0) & (hot == 1)
+    if mode in ('easy', 'hard'):
+        # 没有难度的卡（没跑过 difficulty.py）两边都不算，NaN 的比较结果为 False
+        difficulty = np.asarray(df['difficulty'])
+        return difficulty <= DIFFICULTY_EASY_MAX if mode == 'easy' else difficulty >= DIFFICULTY_HARD_MIN
+    # all
+    return np.ones(len(df), dtype=bool)
+
+
+class CardPool:
+    """
+    一个题库：只读的 int32 id 数组 + 对应的 CardTable 子表 + 卡名索引 + 抽题用的别名表和分层。
+    mask 是题库在整个数据库里的行掩码，全库为 None；用来筛选全库共用的模糊索引结果。
+    建好之后不再修改，多个请求可以放心共享。
+    """
+
+    __slots__ = ("mode", "ids", "table", "names", "mask", "weights", "strata", "_id_set")
+
+    def __init__(self, mode, df):
+        self.mode = mode
+        mask = mode_mask(df, mode)
+        if mask.all():
+            self.mask = None
+        else:
+            mask.setflags(write=False)
+            self.mask = mask
+        self.table = df if mask.all() else df.take(mask)
+        self.ids = self.table.ids
+        self._id_set = frozenset(self.ids.tolist())
+        self.names = NameIndex.from_frame(self.table)
+        self.weights = AliasTable(pool_weights(self.table))
+        self.strata = Strata(stratum_keys(self.table))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, card_id):
+        return card_id in self._id_set
+
+    def sample(self, rng=random):
+        """O(1) 随机抽一张卡，返回卡片 id"""
+        return int(self.ids[rng.randrange(len(self.ids))])
+
+
+class CardStore:
+    """
+    持有卡片数据库以及由它派生出的所有数据：题库、标签表、批量解码的列。
+
+    rebuild() 先在局部把新数据全部建好，再一次性替换内部引用，
+    重新加载数据库时正在处理的请求要么看到旧数据、要么看到新数据，
+    不会看到一半新一半旧。新数据库里删掉的卡保留旧的标签，
+    进行中的对局按 target_id / 猜测 id 查表仍然有结果（只是不会再被抽到或猜到）。
+
+    传入 db 时立即建好；只传 loader（返回 (db, columns) 的函数，如 load_card_data）时
+    推迟到 load() 或第一次访问数据时才加载，import 和建应用本身不读数据库。
+    """
+
+    def __init__(self, db=None, columns=None, loader=None):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loader = loader
+        self._state = None
+        if db is not None:
+            self.rebuild(db, columns)
+
+    def load(self):
+        """还没有数据时用 loader 加载（并发调用只加载一次），返回内部状态"""
+        state = self._state
+        if state is not None:
+            return state
+        with self._load_lock:
+            if self._state is None:
+                if self._loader is None:
+                    raise RuntimeError("CardStore 既没有数据也没有 loader")
+                self.rebuild(*self._loader())
+                startup.finish()
+            return self._state
+
+    @property
+    def _current(self):
+        state = self._state
+        return state if state is not None else self.load()
+
+    def rebuild(self, db, columns=None):
+        """
+        db 为 CardTable 或 load_card_database() 返回的 DataFrame（先转换成 CardTable，不再保留 DataFrame）；
+        columns 为快照里预先解码好的矩阵，不传则现场解码
+        """
+        if not isinstance(db, CardTable):
+            db = CardTable.from_frame(db)
+        if columns is None:
+            with startup.phase("decode_columns"):
+                columns = decode_card_columns(db)
+        with startup.phase("pools"):
+            pools = {mode: CardPool(mode, db) for mode in MODES}
+        with startup.phase("tag_table"):
+            tags = build_tag_table(db, columns)
+        old = self._state
+        if old is not None:
+            for card_id, card_tags in old[2].items():
+                tags.setdefault(card_id, card_tags)
+        # 拼音/三元组索引只对全库建一份，各题库用 mask 过滤
+        with startup.phase("fuzzy_index"):
+            fuzzy = FuzzyIndex.from_frame(db)
+        with startup.phase("solver"):
+            solver = CandidateSolver(db, columns)
+        with startup.phase("similarity"):
+            similarity = SimilarityIndex(db, columns)
+        verdicts = lru_cache(maxsize=COMPARE_CACHE_SIZE)(
+            lambda guess_id, target_id: compare_cards(tags[guess_id], tags[target_id])
+        )
+        compare = lru_cache(maxsize=COMPARE_CACHE_SIZE)(
+            lambda guess_id, target_id: render_compare(tags[guess_id], verdicts(guess_id, target_id))
+        )
+        with self._lock:
+            self._state = (db, pools, tags, columns, compare, verdicts, fuzzy, solver, similarity)
+
+    def apply_hot_diff(self, added=(), removed=()):
+        """
+        增量应用 card_build.py --diff 输出的热门卡变化：只改 hot 列并重建各个题库
+        （热门题库的成员和所有题库 weighted 抽题的权重都取决于 hot），
+        标签表和索引都与 hot 无关，原样沿用。
+        """
+        self.load()
+        with self._lock:
+            db, pools, *rest = self._state
+            hot = db["hot"].copy()
+            hot[db.rows_of(list(added))] = 1
+            hot[db.rows_of(list(removed))] = 0
+            db = db.with_column("hot", hot)
+            pools = {mode: CardPool(mode, db) for mode in MODES}
+            self._state = (db, pools, *rest)
+
+    def tags(self, card_id):
+        """取某张卡预先算好的标签（等价于 card_to_tags(db.loc[card_id])）"""
+        return self._current[2][card_id]
+
+    def compare(self, guess_id, target_id):
+        """compare_tags 的带缓存版本，参数是两张卡的 id，返回 {字段: HTML}"""
+        return self._current[4](guess_id, target_id)
+
+    def verdicts(self, guess_id, target_id):
+        """compare_cards 的带缓存版本，返回 {字段: 判定代码}（不要原地修改）"""
+        return self._current[5](guess_id, target_id)
+
+    def pool(self, mode):
+        """
+        取题库，'daily' 等别名换成对应的题库，未知的 mode 按 'all' 处理；
+        题库为空时沿 MODE_FALLBACKS 换成别的题库（最后是 'all'），只有整个数据库为空时才返回空题库
+        """
+        pools = self._current[1]
+        name = MODE_ALIASES.get(mode, mode)
+        pool = pools.get(name, pools['all'])
+        while not len(pool) and name != 'all':
+            name = MODE_FALLBACKS.get(name, 'all')
+            pool = pools[name]
+        return pool
+
+    def guess_pool(self, mode):
+        """玩家在 mode 下能猜的卡所在的题库（见 GUESS_POOLS），其余 mode 就是出题的题库本身"""
+        name = MODE_ALIASES.get(mode, mode)
+        return self.pool(GUESS_POOLS.get(name, name))
+
+    @property
+    def solver(self):
+        return self._current[7]
+
+    @property
+    def similarity(self):
+        return self._current[8]
+
+    def candidates(self, mode, target_id, guesses, hints=()):
+        """
+        guess_pool(mode) 里与目前所有猜测的对比结果、以及已给出的提示都相容的卡，返回与 db 行顺序一致的布尔掩码。
+        答案本身总在其中（除非它已经从数据库里删除）。
+        """
+        observations = [(g, self.verdicts(g, target_id), self.tags(g)) for g in guesses]
+        return self.solver.consistent(observations, hints, self.guess_pool(mode).mask)
+
+    def remaining(self, mode, target_id, guesses, hints=()):
+        """candidates() 里还剩几张卡"""
+        return int(self.candidates(mode, target_id, guesses, hints).sum())
+
+    def best_hint(self, mode, target_id, guesses, hints=(), name_chars=None):
+        """
+        在 candidates() 上挑下一条提示 (种类, 值)，见 hints.choose_hint；没有可给的返回 None。
+        DISTRACTOR_MODES 里的题库优先给不排除答案最相似的几张候选卡的提示。
+        """
+        mask = self.candidates(mode, target_id, guesses, hints)
+        distractors = None
+        if MODE_ALIASES.get(mode, mode) in DISTRACTOR_MODES:
+            distractors = self.similarity.nearest_mask(target_id, HINT_DISTRACTORS, mask)
+        return choose_hint(self.solver, mask, target_id, self.tags(target_id), name_chars, hints,
+                           distractors=distractors)
+
+    def warmth(self, mode, guess_id, target_id):
+        """猜测与答案的接近度（0~1），按 guess_pool(mode) 里离答案更远的卡的比例计算，见 SimilarityIndex.warmth"""
+        return self.similarity.warmth(guess_id, target_id, self.guess_pool(mode).mask)
+
+    def suggest(self, mode, query, limit):
+        """
+        输入框联想：先取卡名索引的完全/前缀/子串匹配，
+        一个都没有时再用模糊匹配（拼音、首字母、错字）。
+        """
+        pool = self.guess_pool(mode)
+        names = pool.names.search(query, limit)
+        if not names:
+            names = self._current[6].search(query, limit, allowed=pool.mask)
+        return names
+
+    def resolve(self, mode, query):
+        """
+        把提交的卡名解析成 guess_pool(mode) 里的一张卡（卡名索引的完全/前缀/子串匹配），找不到返回 None。
+        模糊匹配可能命中玩家根本没想猜的卡，不会自动当成猜测，只经 did_you_mean() 作为建议。
+        """
+        return self.guess_pool(mode).names.resolve(query)
+
+    def did_you_mean(self, mode, query, limit):
+        """猜测找不到卡时给出的模糊匹配建议（拼音、首字母、错字），按匹配程度排序"""
+        return self._current[6].search(query, limit, allowed=self.guess_pool(mode).mask)
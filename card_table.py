@@ -0,0 +1,158 @@
+import random
+import sys
+
+import numpy as np
+
+# 每一列的存储类型：位域（类型 / 种族 / 属性 / 效果 / 系列）保持数据库里的压缩形式，
+# 只在建索引时由 decode_card_columns 批量展开；能放进 32 位的都用 32 位
+COLUMN_DTYPES = {
+    "type": np.int32,
+    "atk": np.int32,
+    "def": np.int32,
+    "level": np.int32,
+    "race": np.int32,
+    "attribute": np.int32,
+    "category": np.int64,
+    "hot": np.int8,
+    "setcode": np.int64,
+    "difficulty": np.float32,
+}
+
+
+class CardRecord:
+    """
+    一张卡的原始字段（按 id 取出的一行）。
+    record["def"] 等下标写法与 DataFrame 的一行相同，可以直接交给 card_to_tags()。
+    """
+
+    __slots__ = ("id", "name", "type", "atk", "defense", "level", "race", "attribute",
+                 "category", "hot", "setcode", "difficulty")
+
+    def __init__(self, card_id, name, type, atk, defense, level, race, attribute, category, hot, setcode, difficulty):
+        self.id = card_id
+        self.name = name
+        self.type = type
+        self.atk = atk
+        self.defense = defense
+        self.level = level
+        self.race = race
+        self.attribute = attribute
+        self.category = category
+        self.hot = hot
+        self.setcode = setcode
+        self.difficulty = difficulty
+
+    def __getitem__(self, key):
+        return getattr(self, "defense" if key == "def" else key)
+
+    def __repr__(self):
+        return f"CardRecord({self.id}, {self.name!r})"
+
+
+class CardTable:
+    """
+    只读的列式卡表，替代运行时的 pandas DataFrame：每列一个 numpy 数组，id 为升序 int32，
+    卡名放在 object 数组里并做了字符串驻留（各题库子表、索引共用同一批 str 对象）。
+
+    table["atk"] / table.index / len(table) / "difficulty" in table.columns 与 DataFrame 的写法一致，
+    建题库和索引的代码两种输入都能用；按 id 取一行用 get()，不再经过 db.loc。
+    按 id 取行用到的 id → 行号表和按行打包的结构化数组在第一次 get() 时才建。
+    """
+
+    __slots__ = ("ids", "names", "columns", "_data", "_rows", "_packed")
+
+    def __init__(self, ids, names, data):
+        self.ids = ids
+        self.names = names
+        self._data = data
+        self._rows = None
+        self._packed = None
+        self.columns = ("name",) + tuple(data)
+        for arr in (ids, names, *data.values()):
+            arr.setflags(write=False)
+
+    @classmethod
+    def from_arrays(cls, ids, names, data):
+        """ids / names / {列名: 数组}，按 id 排序后转换成 COLUMN_DTYPES 的类型；缺少的列补 0（difficulty 补 NaN）"""
+        ids = np.asarray(ids)
+        order = np.argsort(ids, kind="stable")
+        in_order = bool((order == np.arange(len(order))).all())
+        pick = (lambda a: a) if in_order else (lambda a: a[order])
+
+        names = np.array([sys.intern(str(n)) for n in names], dtype=object)
+        columns = {}
+        for key, dtype in COLUMN_DTYPES.items():
+            if key in data:
+                columns[key] = pick(np.asarray(data[key])).astype(dtype, copy=False)
+            else:
+                columns[key] = np.full(len(ids), np.nan if key == "difficulty" else 0, dtype=dtype)
+        return cls(pick(ids).astype(np.int32), pick(names), columns)
+
+    @classmethod
+    def from_frame(cls, df):
+        """从 load_card_database() 返回的 DataFrame 构建"""
+        data = {key: df[key].to_numpy() for key in COLUMN_DTYPES if key in df.columns}
+        return cls.from_arrays(df.index.to_numpy(), df["name"].tolist(), data)
+
+    def to_frame(self):
+        """转换回 load_card_database() 格式的 DataFrame（离线脚本用，会导入 pandas）"""
+        import pandas as pd
+
+        data = {key: self._data[key] for key in COLUMN_DTYPES}
+        data["name"] = self.names.tolist()
+        return pd.DataFrame(data, index=pd.Index(self.ids.astype(np.int64), name="id"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        return self.names if key == "name" else self._data[key]
+
+    @property
+    def index(self):
+        return self.ids
+
+    def row_of(self, card_id):
+        """卡片 id → 行号，不存在时返回 None"""
+        rows = self._rows
+        if rows is None:
+            rows = self._rows = {card_id: row for row, card_id in enumerate(self.ids.tolist())}
+        return rows.get(card_id)
+
+    def rows_of(self, card_ids):
+        """一批 id 的行号，不存在的 id 直接略过"""
+        card_ids = np.asarray(card_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, card_ids)
+        found = rows < len(self.ids)
+        found[found] = self.ids[rows[found]] == card_ids[found]
+        return rows[found]
+
+    def get(self, card_id):
+        """按 id 取一行，返回 CardRecord；不存在时返回 None"""
+        row = self.row_of(card_id)
+        if row is None:
+            return None
+        packed = self._packed
+        if packed is None:
+            packed = np.empty(len(self.ids), dtype=[(key, dtype) for key, dtype in COLUMN_DTYPES.items()])
+            for key, arr in self._data.items():
+                packed[key] = arr
+            self._packed = packed
+        return CardRecord(int(self.ids[row]), self.names[row], *packed[row].item())
+
+    def __contains__(self, card_id):
+        return self.row_of(card_id) is not None
+
+    def take(self, mask):
+        """布尔掩码（或行号数组）选出的子表"""
+        return CardTable(self.ids[mask], self.names[mask], {key: arr[mask] for key, arr in self._data.items()})
+
+    def with_column(self, key, values):
+        """替换一列后的新表，其余列与原表共用"""
+        data = dict(self._data)
+        data[key] = np.asarray(values).astype(COLUMN_DTYPES[key])
+        return CardTable(self.ids, self.names, data)
+
+    def sample(self, rng=random):
+        """O(1) 随机抽一张卡，返回卡片 id"""
+        return int(self.ids[rng.randrange(len(self.ids))])
@@ -0,0 +1,132 @@
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+
+from data_utils import compare_cards, render_compare
+from sampling import permute
+
+logger = logging.getLogger("ccb.daily")
+
+# 每日一题的种子（需要保密，知道种子就能算出以后每天的答案），换种子就换一套排期；
+# 不设置时由 SECRET_KEY 派生（见 seed_from_secret）
+DAILY_SEED = os.getenv("DAILY_SEED") or None
+# “一天”按哪个时区划分（相对 UTC 的小时数），默认北京时间
+DAILY_UTC_OFFSET = float(os.getenv("DAILY_UTC_OFFSET", 8))
+
+
+def puzzle_date(now=None):
+    """当前的题目日期"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return (now + datetime.timedelta(hours=DAILY_UTC_OFFSET)).date()
+
+
+def seed_from_secret(secret):
+    """由应用的 SECRET_KEY 派生每日一题的种子（单独加盐，种子泄露也推不出 SECRET_KEY）"""
+    return hmac.new(secret.encode(), b"ccb-daily-schedule", hashlib.sha256).hexdigest()
+
+
+def schedule_index(day, n, seed):
+    """
+    第 day 天的题目在题库里的下标：以种子派生的密钥对 0..n-1 做带密钥排列（sampling.permute），
+    按日期序号依次取。题库不变时连续 n 天不会重复，每台机器、每个 worker 算出来都一样；
+    不知道种子就推不出以后的题目。题库为空时抛出 ValueError。
+    """
+    if n <= 0:
+        raise ValueError("每日一题的题库为空")
+    key = int.from_bytes(hashlib.blake2b(seed.encode(), digest_size=8).digest(), "little")
+    return permute(key, n, day.toordinal() % n)
+
+
+class DailyPuzzle:
+    """
+    某一天的题目：答案、答案标签、名称提示候选字，以及题库里每张卡与答案的对比
+    （判定代码和渲染好的 HTML）。建好后只读，猜测时直接查表。
+    """
+
+    __slots__ = ("day", "pool", "target_id", "tags", "hint_chars", "verdicts", "compare")
+
+    def __init__(self, store, pool, day, target_id):
+        self.day = day
+        self.pool = pool
+        self.target_id = target_id
+        self.tags = store.tags(self.target_id)
+        self.hint_chars = [c for c in self.tags["卡名"] if c.strip()]
+        self.verdicts = {}
+        self.compare = {}
+        for guess_id in pool.ids.tolist():
+            guess = store.tags(guess_id)
+            verdicts = compare_cards(guess, self.tags)
+            self.verdicts[guess_id] = verdicts
+            self.compare[guess_id] = render_compare(guess, verdicts)
+
+
+class DailySchedule:
+    """
+    按天缓存 DailyPuzzle：跨天或题库重新加载后第一次访问时重建（其余请求等它建完），
+    之后整天都是查表。
+
+    每天的答案在当天第一次算出来后就固定下来：之后热门卡增量更新或重新加载改变了题库大小，
+    也只重建对比表，不会中途换答案（答案卡被删掉也照常使用，store 保留旧卡的标签）。
+    种子由 configure() 设置（create_app 里调用）；一直没有种子时用进程内的随机种子，
+    排期同样无法预测，但重启后当天的答案会变。
+    """
+
+    def __init__(self, store, mode="daily", seed=DAILY_SEED):
+        self.store = store
+        self.mode = mode
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._puzzle = None
+        self._pinned = {}
+
+    def configure(self, seed):
+        """设置排期种子；seed 为空且还没有种子时改用随机种子并记一条警告"""
+        if seed:
+            self.seed = seed
+        elif not self.seed:
+            logger.warning("没有设置 DAILY_SEED 或 SECRET_KEY，每日一题使用随机种子，重启后答案会变")
+            self.seed = secrets.token_hex(16)
+
+    def target_for(self, day, pool):
+        """第 day 天的答案：第一次调用时按排期从 pool 里取并固定下来（只保留今天及以后的记录）"""
+        target_id = self._pinned.get(day)
+        if target_id is None:
+            if not self.seed:
+                self.seed = secrets.token_hex(16)
+            target_id = int(pool.ids[schedule_index(day, len(pool), self.seed)])
+            self._pinned = {d: t for d, t in self._pinned.items() if d >= day}
+            self._pinned[day] = target_id
+        return target_id
+
+    def today(self):
+        pool = self.store.pool(self.mode)
+        day = puzzle_date()
+        puzzle = self._puzzle
+        if puzzle is not None and puzzle.day == day and puzzle.pool is pool:
+            return puzzle
+        with self._lock:
+            puzzle = self._puzzle
+            if puzzle is None or puzzle.day != day or puzzle.pool is not pool:
+                puzzle = self._puzzle = DailyPuzzle(self.store, pool, day, self.target_for(day, pool))
+            return puzzle
+
+    def lookup(self, target_id):
+        """target_id 是已经建好的今日答案时返回对应的 DailyPuzzle，否则返回 None（不会触发重建）"""
+        puzzle = self._puzzle
+        if puzzle is not None and puzzle.target_id == target_id:
+            return puzzle
+        return None
+
+    def compare(self, guess_id, target_id):
+        """预先算好的 {字段: HTML}，不在表里时返回 None"""
+        puzzle = self.lookup(target_id)
+        return puzzle.compare.get(guess_id) if puzzle is not None else None
+
+    def verdicts(self, guess_id, target_id):
+        """预先算好的 {字段: 判定代码}，不在表里时返回 None"""
+        puzzle = self.lookup(target_id)
+        return puzzle.verdicts.get(guess_id) if puzzle is not None else None
@@ -1,8 +1,12 @@
+import os
 import sqlite3
-import pandas as pd
-import numbers
+import numpy as np
+from functools import lru_cache
 from pathlib import Path
 import sys
+import startup
+from card_table import CardTable
+from metrics import timed
 from map import RACE_MAP, TYPE_MAP, CATEGORY_TAGS, TYPE_LINK, LINK_MARKERS, SETNAME_MAP, ATTR_MAP, TYPE_PENDULUM
 
 
@@ -15,21 +19,11 @@ def parse_category(cat):
 
 
 def parse_setcode(setcode, name_map):
-    # 1. 转成大写十六进制字符串
-    hex_str = f"{setcode:X}"
-    # 2. 左侧补零，使长度成为 4 的倍数
-    pad_len = (-len(hex_str)) % 4
-    if pad_len:
-        hex_str = hex_str.zfill(len(hex_str) + pad_len)
-    # 3. 每 4 位一组
+    # setcode 由 4 段 16 位系列码组成，从高到低依次取出，全 0 的段跳过
     names = []
-    for i in range(0, len(hex_str), 4):
-        segment = hex_str[i:i + 4]
-        # 全 0 的段跳过
-        if segment == "0000":
-            continue
-        code = int(segment, 16)
-        if code in name_map:
+    for shift in (48, 32, 16, 0):
+        code = (setcode >> shift) & 0xFFFF
+        if code and code in name_map:
             names.append(name_map[code])
     return names
 
@@ -41,16 +35,87 @@ def extract_arrows(def_value):
     return [sym for bit, sym in LINK_MARKERS.items() if def_value & bit]
 
 
-def load_card_database(path: str = None) -> pd.DataFrame:
+# ---------- 整列批量解码 ----------
+# 位序固定下来，矩阵的第 j 列对应 *_BITS[j]
+TYPE_BITS = np.array(list(TYPE_MAP), dtype=np.uint64)
+RACE_BITS = np.array(list(RACE_MAP), dtype=np.uint64)
+ATTR_BITS = np.array(list(ATTR_MAP), dtype=np.uint64)
+CATEGORY_BITS = np.array([code - 1100 for code in CATEGORY_TAGS], dtype=np.uint64)
+LINK_BITS = np.array(list(LINK_MARKERS), dtype=np.uint64)
+# 系列码每 16 位一段，从高位到低位，与 parse_setcode 的输出顺序一致
+SETCODE_SHIFTS = np.array([48, 32, 16, 0], dtype=np.uint64)
+
+
+def _as_uint64(values):
+    # sqlite 的 INTEGER 是有符号 64 位，转成无符号后位模式不变
+    return np.asarray(values).astype(np.int64).view(np.uint64)
+
+
+def decode_flags_matrix(values, bits):
     """
-    加载 cards.cdb 里的 datas 和 texts 两张表，
-    合并、去重、按 id 排序后返回一个 DataFrame。
+    把一整列位域解码成布尔矩阵，形状 (len(values), len(bits))，
+    第 j 列表示该位 bits[j] 是否置位。
+    """
+    return (_as_uint64(values)[:, None] & bits[None, :]) != 0
+
+
+def decode_category_matrix(values):
+    """category 列 → 布尔矩阵，列顺序与 CATEGORY_TAGS 相同"""
+    return ((_as_uint64(values)[:, None] >> CATEGORY_BITS[None, :]) & np.uint64(1)) != 0
+
+
+def split_setcodes(values):
+    """setcode 列 → (n, 4) 的 uint16 数组，每行是从高到低的 4 个系列码，0 表示空"""
+    return ((_as_uint64(values)[:, None] >> SETCODE_SHIFTS[None, :]) & np.uint64(0xFFFF)).astype(np.uint16)
+
+
+def decode_link_matrix(def_values, types=None):
+    """
+    def 列 → 连接箭头布尔矩阵，列顺序与 LINK_MARKERS 相同。
+    传入 types 时，非连接怪兽的行全部置 False（它们的 def 是守备力）。
+    """
+    matrix = decode_flags_matrix(def_values, LINK_BITS)
+    if types is not None:
+        matrix &= ((_as_uint64(types) & np.uint64(TYPE_LINK)) != 0)[:, None]
+    return matrix
+
+
+def decode_card_columns(df):
+    """
+    一次性解码 load_card_database() 返回的整张表，结果按 df 的行顺序排列：
+
+      type / race / attribute / category / arrows：布尔矩阵
+      setcode：(n, 4) uint16 系列码
+      rank / scale：等级（阶级、连接值）和灵摆刻度
+      is_link / is_pendulum：布尔向量
+
+    这些矩阵既用来生成标签表，也可以直接用于题库筛选和相似度计算。
+    """
+    types = np.asarray(df["type"])
+    levels = np.asarray(df["level"])
+    return {
+        "type": decode_flags_matrix(types, TYPE_BITS),
+        "race": decode_flags_matrix(np.asarray(df["race"]), RACE_BITS),
+        "attribute": decode_flags_matrix(np.asarray(df["attribute"]), ATTR_BITS),
+        "category": decode_category_matrix(np.asarray(df["category"])),
+        "setcode": split_setcodes(np.asarray(df["setcode"])),
+        "arrows": decode_link_matrix(np.asarray(df["def"]), types),
+        "rank": (levels & 0xFF).astype(np.int16),
+        "scale": ((levels >> 24) & 0xFF).astype(np.int16),
+        "is_link": (types & TYPE_LINK) != 0,
+        "is_pendulum": (types & TYPE_PENDULUM) != 0,
+    }
 
-    如果不传入 path，则自动：
+
+def locate_card_database(path: str = None) -> Path:
+    """
+    找到 cards.cdb 的路径。如果不传入 path，则自动：
+      · 设置了环境变量 CARDS_DB 时使用它（基准测试用合成数据库时很方便）
       · 在 PyInstaller 打包后的环境中，从 sys._MEIPASS 找到临时目录里的 cards.cdb
       · 否则从当前脚本同级目录下加载 cards.cdb
     """
-    # 1. 自动定位数据库文件
+    if path is None:
+        path = os.environ.get("CARDS_DB")
     if path is None:
         # PyInstaller 打包后会把数据放到 _MEIPASS 里
         base = getattr(sys, "_MEIPASS", None)
@@ -60,26 +125,102 @@ def load_card_database(path: str = None) -> pd.DataFrame:
         else:
             # 打包执行时，_MEIPASS 已经是一个 str 临时目录
             base = Path(base)
-        db_file = base / "cards.cdb"
-    else:
-        db_file = Path(path)
+        return base / "cards.cdb"
+    return Path(path)
 
+
+def load_card_data(path: str = None, use_snapshot: bool = True):
+    """
+    服务运行时用的加载入口，全程不导入 pandas。返回 (table, columns)：
+    table 为 CardTable（内容同 load_card_database()），
+    columns 为快照里预先解码好的矩阵（见 decode_card_columns），没有快照时为 None。
+    """
+    db_file = locate_card_database(path)
     if not db_file.exists():
         raise FileNotFoundError(f"找不到数据库文件：{db_file}")
 
-    # 2. 连接并读取表
+    # 快照与 cards.cdb 一致时直接内存映射，跳过 SQLite
+    if use_snapshot:
+        from snapshot import load_snapshot
+        with startup.phase("snapshot_load"):
+            loaded = load_snapshot(db_file)
+        if loaded is not None:
+            return loaded
+    return read_card_table(db_file), None
+
+
+# 从 datas 读取的整数列，顺序与 SELECT 一致；NULL 按 0 处理
+DATA_COLUMNS = ["type", "atk", "def", "level", "race", "attribute", "category", "hot", "setcode"]
+
+
+def read_card_table(path: str = None) -> CardTable:
+    """
+    不经过 pandas 直接用 sqlite3 读取 cards.cdb：datas 与 texts 按 id 内连接、按 id 排序，
+    同名卡只保留 id 最小的一张，结果与 load_card_database(use_snapshot=False) 相同。
+    """
+    db_file = locate_card_database(path)
+    if not db_file.exists():
+        raise FileNotFoundError(f"找不到数据库文件：{db_file}")
+
+    with startup.phase("sqlite_read"):
+        conn = sqlite3.connect(str(db_file))
+        # difficulty 列由 difficulty.py 离线写入，没有时补 NaN
+        has_difficulty = any(r[1] == "difficulty" for r in conn.execute("PRAGMA table_info(datas)"))
+        select = ", ".join(f"COALESCE(d.{col}, 0)" for col in DATA_COLUMNS)
+        rows = conn.execute(
+            f"SELECT d.id, t.name, {select}" + (", d.difficulty" if has_difficulty else "")
+            + " FROM datas d JOIN texts t ON t.id = d.id ORDER BY d.id"
+        ).fetchall()
+        conn.close()
+
+    with startup.phase("join_dedupe"):
+        seen = set()
+        kept = []
+        for row in rows:
+            if row[1] not in seen:
+                seen.add(row[1])
+                kept.append(row)
+        values = list(zip(*kept)) or [()] * (len(DATA_COLUMNS) + 2 + has_difficulty)
+        data = {col: np.array(values[i + 2], dtype=np.int64) for i, col in enumerate(DATA_COLUMNS)}
+        if has_difficulty:
+            data["difficulty"] = np.array(values[-1], dtype=np.float64)
+        return CardTable.from_arrays(np.array(values[0], dtype=np.int64), values[1], data)
+
+
+def load_card_database(path: str = None, use_snapshot: bool = True) -> "pandas.DataFrame":
+    """
+    加载 cards.cdb 里的 datas 和 texts 两张表，
+    合并、去重、按 id 排序后返回一个 DataFrame（离线脚本和基准测试用，服务本身用 load_card_data()）。
+
+    路径规则见 locate_card_database()。
+    同目录下有新鲜的 cards.snapshot/（python snapshot.py 生成）时直接从快照加载。
+    """
+    import pandas as pd
+
+    if use_snapshot:
+        return load_card_data(path)[0].to_frame()
+
+    db_file = locate_card_database(path)
+    if not db_file.exists():
+        raise FileNotFoundError(f"找不到数据库文件：{db_file}")
+
+    # 1. 连接并读取表
     conn = sqlite3.connect(str(db_file))
+    # difficulty 列由 difficulty.py 离线写入，没有时补 NaN
+    has_difficulty = any(r[1] == "difficulty" for r in conn.execute("PRAGMA table_info(datas)"))
     datas = pd.read_sql_query(
-        "SELECT id, type, atk, def, level, race, attribute, category, hot, setcode FROM datas",
+        "SELECT id, type, atk, def, level, race, attribute, category, hot, setcode"
+        + (", difficulty" if has_difficulty else "") + " FROM datas",
         conn, index_col="id"
     )
+    datas["difficulty"] = datas["difficulty"].astype(np.float64) if has_difficulty else np.nan
     texts = pd.read_sql_query(
         "SELECT id, name FROM texts",
         conn, index_col="id"
     )
     conn.close()
 
-    # 3. 合并去重并返回
+    # 2. 合并去重并返回
     df = datas.join(texts, how="inner").reset_index()
     df = (
         df
@@ -90,6 +231,7 @@ def load_card_database(path: str = None) -> pd.DataFrame:
     return df
 
 
+@timed("card_to_tags")
 def card_to_tags(row):
     is_link = bool(row["type"] & TYPE_LINK)
     is_pendulum = bool(row["type"] & TYPE_PENDULUM)
@@ -113,64 +255,165 @@ def card_to_tags(row):
     }
 
 
-def compare_tags(guess_tags, answer_tags):
-    def cmp(key, val1, val2):
-        if (val1 == "" or val1 is None) and (val2 == "" or val2 is None):
-            return '<span class="tag tag-gray">—</span>'
-            # 如果其中一个没——黄色“部分”
-        if val1 == "" or val1 is None or val2 == "" or val2 is None:
-            return '<span class="partial">—</span>'
-
-        if key == "箭头":
-            pills = []
-            # 对八个方向都展示一个小标签
-            for bit, sym in LINK_MARKERS.items():
-                if sym in val1:
-                    # 猜的里有
-                    cls = "tag-green" if sym in val2 else "tag-red"
-                else:
-                    # 猜的里没有
-                    cls = "tag-gray"
-                pills.append(f'<span class="tag {cls}">{sym}</span>')
-            return " ".join(pills)
-        # 数值型字段：攻击、守备、等级、刻度
-        if isinstance(val1, numbers.Number):
-            diff = abs(val1 - val2)
-            # 先判断完全相等
-            if diff == 0:
-                cls = "tag-green"
-            else:
-                if key in ("攻击", "守备"):
-                    if diff <= 500:
-                        cls = "tag-yellow"
-                    else:
-                        cls = "tag-gray"
-                elif key in ("等级/阶级", "刻度"):
-                    if diff <= 2:
-                        cls = "tag-yellow"
-                    else:
-                        cls = "tag-gray"
-                else:
-                    cls = "tag-gray"
-            # 箭头
-            arrow = "" if diff == 0 else ("↑" if val1 < val2 else "↓")
-            return f'<span class="tag {cls}">{val1}{arrow}</span>'
-
-        # 列表型字段：如 类型、效果标签……
-        elif isinstance(val1, list):
-            pills = []
-            for t in val1:
-                # 猜的 tag 在目标里才 green，否则 red
-                cls = "tag-green" if t in val2 else "tag-gray"
-                pills.append(f'<span class="tag {cls}">{t}</span>')
-            return " ".join(pills) or '<span class="tag tag-gray">—</span>'
-
-        # 其它（字符串等）完全匹配才 green，否则 gray
-        else:
-            cls = "tag-green" if val1 == val2 else "tag-gray    "
-            return f'<span class="tag {cls}">{val1}</span>'
+def _rows_to_lists(matrix, labels):
+    """布尔矩阵的每一行 → 置位列对应的 labels 列表"""
+    labels = np.asarray(labels, dtype=object)
+    return [labels[row].tolist() for row in matrix]
 
-    return {
-        key: cmp(key, guess_tags[key], answer_tags[key])
-        for key in guess_tags
-    }
+
+def build_tag_table(df, columns=None):
+    """
+    一次性为 df 里的每张卡算好 card_to_tags 的结果，返回 {id: tags}。
+
+    位域用 decode_card_columns 的批量解码结果，类型/效果/系列/箭头
+    只对每个不同的取值转换一次成名称列表，再按行查表拼装。
+    结果与逐行调用 card_to_tags 相同（数值为 Python int），
+    表中的列表会被多个请求共享，使用方不要原地修改。
+    """
+    if columns is None:
+        columns = decode_card_columns(df)
+
+    def decode_unique(values, matrix, labels):
+        _, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+        lists = _rows_to_lists(matrix[first], labels)
+        return [lists[i] for i in inverse.ravel()]
+
+    type_names = decode_unique(np.asarray(df["type"]), columns["type"], list(TYPE_MAP.values()))
+    categories = decode_unique(np.asarray(df["category"]), columns["category"], list(CATEGORY_TAGS.values()))
+    arrows = decode_unique(
+        np.where(columns["is_link"], np.asarray(df["def"]), 0), columns["arrows"], list(LINK_MARKERS.values())
+    )
+    setcodes = np.asarray(df["setcode"])
+    _, first, inverse = np.unique(setcodes, return_index=True, return_inverse=True)
+    setname_lists = [
+        [SETNAME_MAP[code] for code in row if code and code in SETNAME_MAP]
+        for row in columns["setcode"][first].tolist()
+    ]
+    setnames = [setname_lists[i] for i in inverse.ravel()]
+    attributes = [ATTR_MAP.get(v, f"0x{v:X}") for v in df["attribute"].tolist()]
+    races = [RACE_MAP.get(v, f"0x{v:X}") for v in df["race"].tolist()]
+
+    rows = zip(
+        df.index.tolist(), df["name"].tolist(), df["atk"].tolist(), df["def"].tolist(),
+        columns["rank"].tolist(), columns["scale"].tolist(),
+        columns["is_link"].tolist(), columns["is_pendulum"].tolist(),
+        type_names, attributes, races, categories, setnames, arrows,
+    )
+    table = {}
+    for (card_id, name, atk, defense, rank, scale, link, pendulum,
+         type_list, attribute, race, category_list, setname_list, arrow_list) in rows:
+        table[card_id] = {
+            "卡名": name,
+            "攻击": atk,
+            "守备": "" if link else defense,
+            "等级/阶级": rank,
+            "箭头": arrow_list,
+            "刻度": scale if pendulum else "",
+            "类型": type_list,
+            "属性": attribute,
+            "种族": race,
+            "效果标签": category_list,
+            "系列": setname_list,
+        }
+    return table
+
+
+# ---------- 对比：判定与渲染分开 ----------
+# card_to_tags 的字段顺序，也是对比结果的字段顺序
+COMPARE_FIELDS = ["卡名", "攻击", "守备", "等级/阶级", "箭头", "刻度", "类型", "属性", "种族", "效果标签", "系列"]
+# 判定代码
+V_GREEN = 0     # 完全一致
+V_YELLOW = 1    # 接近（攻守差 500 以内、等级/刻度差 2 以内）
+V_GRAY = 2      # 不一致 / 目标没有
+V_RED = 3       # 箭头：猜的有、目标没有
+V_PARTIAL = 4   # 一方有值、另一方为空（如守备 vs 连接怪兽）
+# 数值方向：目标比猜测更大 / 更小
+DIR_NONE = 0
+DIR_UP = 1
+DIR_DOWN = 2
+
+VERDICT_CLASSES = {V_GREEN: "tag-green", V_YELLOW: "tag-yellow", V_GRAY: "tag-gray", V_RED: "tag-red"}
+DIRECTION_ARROWS = {DIR_NONE: "", DIR_UP: "↑", DIR_DOWN: "↓"}
+# 数值字段的值类型（标签表里是 int，逐行 card_to_tags 得到的是 numpy 整数）
+NUMBER_TYPES = (int, float, np.number)
+# 允许“接近”判定的数值字段及其阈值
+NEAR_THRESHOLDS = {"攻击": 500, "守备": 500, "等级/阶级": 2, "刻度": 2}
+
+
+def _is_empty(value):
+    return value == "" or value is None
+
+
+def compare_field(key, val1, val2):
+    """
+    对比单个字段，返回判定代码：
+      · 双方都为空：V_GRAY；只有一方为空：V_PARTIAL
+      · 箭头：8 个方向各一个代码（按 LINK_MARKERS 顺序）
+      · 数值：(判定, 方向)
+      · 列表：猜测里每一项一个代码
+      · 其它：单个代码
+    """
+    if _is_empty(val1) and _is_empty(val2):
+        return V_GRAY
+    if _is_empty(val1) or _is_empty(val2):
+        return V_PARTIAL
+
+    if key == "箭头":
+        if not val1:
+            return [V_GRAY] * len(LINK_MARKERS)
+        return [
+            (V_GREEN if sym in val2 else V_RED) if sym in val1 else V_GRAY
+            for sym in LINK_MARKERS.values()
+        ]
+    if isinstance(val1, NUMBER_TYPES):
+        diff = abs(val1 - val2)
+        if diff == 0:
+            return V_GREEN, DIR_NONE
+        verdict = V_YELLOW if diff <= NEAR_THRESHOLDS.get(key, -1) else V_GRAY
+        return verdict, (DIR_UP if val1 < val2 else DIR_DOWN)
+    if isinstance(val1, list):
+        return [V_GREEN if t in val2 else V_GRAY for t in val1]
+    return V_GREEN if val1 == val2 else V_GRAY
+
+
+@timed("compare")
+def compare_cards(guess_tags, answer_tags):
+    """对比两张卡的标签，返回 {字段: 判定代码}，结构见 compare_field"""
+    return {key: compare_field(key, guess_tags[key], answer_tags[key]) for key in guess_tags}
+
+
+@lru_cache(maxsize=65536)
+def render_fragment(key, value, verdict):
+    """渲染单个值的 HTML 小片段，按 (字段, 值, 判定) 缓存"""
+    if verdict == V_PARTIAL:
+        return '<span class="partial">—</span>'
+    if isinstance(verdict, tuple):
+        code, direction = verdict
+        return f'<span class="tag {VERDICT_CLASSES[code]}">{value}{DIRECTION_ARROWS[direction]}</span>'
+    if _is_empty(value):
+        return '<span class="tag tag-gray">—</span>'
+    return f'<span class="tag {VERDICT_CLASSES[verdict]}">{value}</span>'
+
+
+@lru_cache(maxsize=65536)
+def _render_items(key, items, verdicts):
+    html = " ".join(render_fragment(key, item, code) for item, code in zip(items, verdicts))
+    return html or '<span class="tag tag-gray">—</span>'
+
+
+def render_field(key, value, verdict):
+    if isinstance(verdict, list):
+        items = tuple(LINK_MARKERS.values()) if key == "箭头" else tuple(value)
+        return _render_items(key, items, tuple(verdict))
+    return render_fragment(key, value, verdict)
+
+
+@timed("render_compare")
+def render_compare(guess_tags, verdicts):
+    """把 compare_cards 的判定结果渲染成 {字段: HTML}"""
+    return {key: render_field(key, guess_tags[key], verdict) for key, verdict in verdicts.items()}
+
+
+def compare_tags(guess_tags, answer_tags):
+    """对比并直接渲染成 HTML，等价于 render_compare(guess, compare_cards(guess, answer))"""
+    return render_compare(guess_tags, compare_cards(guess_tags, answer_tags))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# difficulty.py — 离线模拟猜卡，给每张卡算一个难度（期望猜测次数），写回 cards.cdb 的 difficulty 列
+#
+#   python difficulty.py                    # 全部卡片，按 CPU 核数开进程
+#   python difficulty.py --workers 4 --runs 5
+#   python difficulty.py --modes hot        # 只重算热门怪兽卡
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from card_store import mode_mask
+from data_utils import (
+    COMPARE_FIELDS, build_tag_table, compare_cards, decode_card_columns, load_card_data, locate_card_database,
+)
+from solver import CandidateSolver
+
+# 每张卡按它所在的第一个题库模拟：猜的人只能从这个题库里猜
+HOME_MODES = ('hot', 'monster', 'spell', 'trap', 'all')
+# 超过这么多次还没猜中就按这么多次算
+MAX_GUESSES = 30
+# 每一步从候选里抽几张作为备选猜测，以及用几张候选估计每个备选能把候选集合分成多细
+GUESS_SAMPLE = 8
+PROBE_SAMPLE = 32
+# 每个进程一次领多少张卡
+CHUNK_SIZE = 64
+
+_worker = None
+
+
+class Simulator:
+    """
+    贪心的模拟玩家：每一步只在与目前所有对比结果相容的卡里猜（等价于 compare_tags 的判定规则），
+    从中抽 GUESS_SAMPLE 张备选，用 PROBE_SAMPLE 张候选当假想答案，
+    选对比结果分组最细（Σ 组大小²，即期望剩余张数最小）的那张去猜。
+    """
+
+    def __init__(self, db, columns=None):
+        if columns is None:
+            columns = decode_card_columns(db)
+        self.solver = CandidateSolver(db, columns)
+        self.tags = build_tag_table(db, columns)
+        self.ids = self.solver.ids.tolist()
+        self.masks = {mode: mode_mask(db, mode) for mode in HOME_MODES}
+
+    def signature(self, guess_id, target_id):
+        verdicts = compare_cards(self.tags[guess_id], self.tags[target_id])
+        return tuple(tuple(v) if isinstance(v, list) else v for v in map(verdicts.get, COMPARE_FIELDS))
+
+    def pick_guess(self, rows, rng):
+        if len(rows) <= 2:
+            return self.ids[rng.choice(rows)]
+        probes = [self.ids[r] for r in rng.sample(rows, min(PROBE_SAMPLE, len(rows)))]
+        best, best_score = None, None
+        for r in rng.sample(rows, min(GUESS_SAMPLE, len(rows))):
+            guess_id = self.ids[r]
+            groups = {}
+            for target_id in probes:
+                sig = self.signature(guess_id, target_id)
+                groups[sig] = groups.get(sig, 0) + 1
+            score = sum(c * c for c in groups.values())
+            if best_score is None or score < best_score:
+                best, best_score = guess_id, score
+        return best
+
+    def play(self, mode, target_id, rng):
+        """模拟一局，返回猜中时用了几次"""
+        mask = self.masks[mode].copy()
+        for n in range(1, MAX_GUESSES + 1):
+            guess_id = self.pick_guess(np.flatnonzero(mask).tolist(), rng)
+            if guess_id == target_id:
+                return n
+            verdicts = compare_cards(self.tags[guess_id], self.tags[target_id])
+            mask &= self.solver.guess_mask(guess_id, verdicts, self.tags[guess_id])
+        return MAX_GUESSES
+
+
+def _init_worker(db_path):
+    global _worker
+    _worker = Simulator(*load_card_data(db_path))
+
+
+def simulate_chunk(task):
+    """(题库, [卡片 id], 每张卡模拟几局, 种子) → [(卡片 id, 平均猜测次数)]"""
+    mode, target_ids, runs, seed = task
+    results = []
+    for target_id in target_ids:
+        total = 0
+        for run in range(runs):
+            total += _worker.play(mode, target_id, random.Random(f"{seed}:{target_id}:{run}"))
+        results.append((target_id, total / runs))
+    return results
+
+
+def home_modes(db, modes=HOME_MODES):
+    """每张卡 → 它所在的第一个题库，只保留 modes 里的"""
+    home = {}
+    for mode in HOME_MODES:
+        for card_id in db.index[mode_mask(db, mode)].tolist():
+            home.setdefault(card_id, mode)
+    return {card_id: mode for card_id, mode in home.items() if mode in modes}
+
+
+def ensure_difficulty_column(cur):
+    cur.execute("PRAGMA table_info(datas);")
+    if "difficulty" not in [r[1] for r in cur.fetchall()]:
+        print("➕ 在 datas 表中添加 difficulty 字段")
+        cur.execute("ALTER TABLE datas ADD COLUMN difficulty REAL;")
+
+
+def write_difficulty(db_path, results):
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    ensure_difficulty_column(cur)
+    cur.executemany("UPDATE datas SET difficulty = ? WHERE id = ?;", ((d, i) for i, d in results))
+    conn.commit()
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟猜卡，把每张卡的期望猜测次数写进 cards.cdb 的 difficulty 列")
+    parser.add_argument("--db", help="卡片数据库路径（默认同 locate_card_database）")
+    parser.add_argument("--modes", nargs="+", choices=HOME_MODES, default=list(HOME_MODES),
+                        help="只重算这些题库里的卡")
+    parser.add_argument("--runs", type=int, default=3, help="每张卡模拟几局取平均")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="进程数")
+    parser.add_argument("--seed", default="difficulty", help="随机种子，相同种子结果可复现")
+    args = parser.parse_args(argv)
+
+    db_path = str(locate_card_database(args.db))
+    db, _ = load_card_data(db_path, use_snapshot=False)
+    home = home_modes(db, args.modes)
+    tasks = []
+    for mode in args.modes:
+        ids = [card_id for card_id, m in home.items() if m == mode]
+        for i in range(0, len(ids), CHUNK_SIZE):
+            tasks.append((mode, ids[i:i + CHUNK_SIZE], args.runs, args.seed))
+    print(f"🔄 模拟 {len(home)} 张卡，每张 {args.runs} 局，{args.workers} 个进程 …")
+
+    t0 = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        for done, chunk in enumerate(pool.map(simulate_chunk, tasks), 1):
+            results.extend(chunk)
+            print(f"\r   {done}/{len(tasks)}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    print(f"✅ 模拟完成，用时 {time.perf_counter() - t0:.1f}s")
+
+    for mode in args.modes:
+        values = np.array([d for card_id, d in results if home[card_id] == mode])
+        if len(values):
+            q = np.percentile(values, [10, 50, 90])
+            print(f"   {mode:8s} {len(values):6d} 张  平均 {values.mean():.2f}  P10/P50/P90 {q[0]:.2f}/{q[1]:.2f}/{q[2]:.2f}")
+
+    write_difficulty(db_path, results)
+    print(f"📝 已写入 {db_path} 的 difficulty 列")
+
+
+if __name__ == "__main__":
+    main()
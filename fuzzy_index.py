@@ -0,0 +1,212 @@
+from bisect import bisect_right
+from functools import lru_cache
+
+import numpy as np
+
+from name_index import normalize_name
+
+# 变体种类：规范化卡名、全拼、拼音首字母
+KIND_NAME = 0
+KIND_PINYIN = 1
+KIND_INITIALS = 2
+
+# 每次最多对多少个三元组命中最多的变体做编辑距离校验；
+# 不足 3 个字的查询（如单个拼音字母）最多收集 MAX_VERIFY × limit 个包含它的变体
+MAX_VERIFY = 64
+
+
+@lru_cache(maxsize=None)
+def _lazy_pinyin():
+    """pypinyin 的词典导入要几百毫秒，第一次建索引时才导入"""
+    try:
+        from pypinyin import lazy_pinyin
+    except ImportError:  # 没装 pypinyin 时只按卡名本身做模糊匹配
+        return None
+    return lazy_pinyin
+
+
+@lru_cache(maxsize=None)
+def _char_pinyin(ch):
+    """单个字的拼音（不带声调），非汉字原样返回"""
+    lazy_pinyin = _lazy_pinyin()
+    if lazy_pinyin is None or not "㐀" <= ch <= "鿿":
+        return ch
+    return lazy_pinyin(ch)[0]
+
+
+def transliterate(key):
+    """
+    规范化卡名 → (全拼, 首字母)，逐字查拼音并缓存。
+    多音字取默认读音；非汉字（字母、数字、符号）在两种变体里都原样保留。
+    没装 pypinyin 时两者都等于 key。
+    """
+    full = []
+    initials = []
+    for ch in key:
+        py = _char_pinyin(ch)
+        full.append(py)
+        initials.append(py[0] if py != ch else ch)
+    return "".join(full), "".join(initials)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def default_max_distance(query):
+    """允许的编辑距离随查询长度增加：≤2 个字必须精确，≤5 个字容忍 1 处错误，更长容忍 2 处"""
+    n = len(query)
+    if n <= 2:
+        return 0
+    return 1 if n <= 5 else 2
+
+
+def substring_distance(query, text, bound):
+    """
+    query 与 text 中任意一段子串的最小编辑距离（Sellers 算法），
+    超过 bound 时提前返回 bound + 1。
+    """
+    if query in text:
+        return 0
+    prev = [0] * (len(text) + 1)
+    for i, qc in enumerate(query, 1):
+        cur = [i]
+        left = i
+        best = i
+        for j, tc in enumerate(text):
+            # 替换 / 删除 / 插入，三者取最小（展开写，比 min() 快得多）
+            d = prev[j] if qc == tc else prev[j] + 1
+            up = prev[j + 1] + 1
+            if up < d:
+                d = up
+            if left + 1 < d:
+                d = left + 1
+            cur.append(d)
+            left = d
+            if d < best:
+                best = d
+        if best > bound:
+            return bound + 1
+        prev = cur
+    return min(prev)
+
+
+class FuzzyIndex:
+    """
+    容错的卡名匹配引擎，在 NameIndex 找不到结果时兜底。
+
+    每张卡预先生成几个变体：规范化卡名、全拼、拼音首字母（后两者需要 pypinyin），
+    所有变体按三元组建倒排表。查询时：
+      1. 查询本身（含汉字时再加上它的全拼）拆成三元组，np.bincount 统计每个变体命中的个数；
+         不足 3 个字的查询直接在拼接好的变体文本里找子串
+      2. 命中数足够的变体里取最多 MAX_VERIFY 个，用带上限的子串编辑距离校验
+      3. 按 (编辑距离, 变体与查询的长度差, 变体种类, 位置) 排序，结果确定
+
+    位置即构建时传入的行号，与 load_card_database() 的 DataFrame 行顺序一致，
+    allowed 传入同长度的布尔掩码即可把结果限制在某个题库里。
+    """
+
+    def __init__(self, names, ids=None):
+        self.names = list(names)
+        self.ids = list(ids) if ids is not None else list(range(len(self.names)))
+
+        variants = []
+        owners = []
+        kinds = []
+        for pos, name in enumerate(self.names):
+            key = normalize_name(name)
+            full, initials = transliterate(key)
+            for kind, text in ((KIND_NAME, key), (KIND_PINYIN, full), (KIND_INITIALS, initials)):
+                if kind != KIND_NAME and text == key:
+                    continue
+                variants.append(text)
+                owners.append(pos)
+                kinds.append(kind)
+        self.variants = variants
+        self.owners = np.asarray(owners, dtype=np.int32)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+
+        postings = {}
+        for vid, text in enumerate(variants):
+            for gram in trigrams(text):
+                postings.setdefault(gram, []).append(vid)
+        self.postings = {g: np.asarray(v, dtype=np.int32) for g, v in postings.items()}
+
+        # 短查询用：所有变体用 \n 拼成一段文本，子串查找交给 str.find
+        self._joined = "\n".join(variants)
+        self._starts = np.cumsum([0] + [len(v) + 1 for v in variants[:-1]]).tolist()
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df["name"].tolist(), df.index.tolist())
+
+    def _short_candidates(self, key, allowed=None, cap=None):
+        """不足 3 个字的查询：在拼接文本里逐个找出包含它的变体（只要 allowed 里的，最多 cap 个）"""
+        found = []
+        start = self._joined.find(key)
+        while start != -1:
+            vid = bisect_right(self._starts, start) - 1
+            if allowed is None or allowed[self.owners[vid]]:
+                found.append(vid)
+                if cap is not None and len(found) >= cap:
+                    break
+            # 跳到下一个变体，同一个变体只记一次
+            nxt = self._starts[vid + 1] if vid + 1 < len(self._starts) else len(self._joined)
+            start = self._joined.find(key, nxt)
+        return found
+
+    def _gram_candidates(self, key, bound, allowed):
+        grams = [self.postings[g] for g in trigrams(key) if g in self.postings]
+        if not grams:
+            return []
+        counts = np.bincount(np.concatenate(grams), minlength=len(self.variants))
+        # 每处编辑最多破坏 3 个三元组
+        need = max(1, len(key) - 2 - 3 * bound)
+        cand = np.flatnonzero(counts >= need)
+        if allowed is not None:
+            cand = cand[allowed[self.owners[cand]]]
+        if len(cand) > MAX_VERIFY:
+            # 命中多的优先，相同时按变体编号（即位置）保持确定顺序
+            order = np.lexsort((cand, -counts[cand]))[:MAX_VERIFY]
+            cand = cand[order]
+        return cand.tolist()
+
+    def _score(self, key, bound, allowed, best, limit):
+        short = len(key) < 3
+        if short:
+            candidates = self._short_candidates(key, allowed, MAX_VERIFY * limit)
+        else:
+            candidates = self._gram_candidates(key, bound, allowed)
+        for vid in candidates:
+            text = self.variants[vid]
+            # 短查询的候选本身就包含查询，距离一定是 0
+            dist = 0 if short else substring_distance(key, text, bound)
+            if dist > bound:
+                continue
+            pos = int(self.owners[vid])
+            score = (dist, abs(len(text) - len(key)), int(self.kinds[vid]), pos)
+            if pos not in best or score < best[pos]:
+                best[pos] = score
+
+    def search_positions(self, query, limit=10, allowed=None, max_distance=None):
+        """返回最多 limit 个位置，按匹配程度排序"""
+        key = normalize_name(query)
+        if not key:
+            return []
+        bound = default_max_distance(key) if max_distance is None else max_distance
+        best = {}
+        self._score(key, bound, allowed, best, limit)
+        full, _ = transliterate(key)
+        if full != key:
+            self._score(full, default_max_distance(full) if max_distance is None else bound, allowed, best, limit)
+        ranked = sorted(best.items(), key=lambda item: item[1])
+        return [pos for pos, _ in ranked[:limit]]
+
+    def search(self, query, limit=10, allowed=None, max_distance=None):
+        return [self.names[pos] for pos in self.search_positions(query, limit, allowed, max_distance)]
+
+    def search_ids(self, query, limit=10, allowed=None, max_distance=None):
+        return [self.ids[pos] for pos in self.search_positions(query, limit, allowed, max_distance)]
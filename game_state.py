@@ -0,0 +1,95 @@
+from array import array
+
+from map import ATTR_MAP, CATEGORY_TAGS
+
+# 编码格式版本号，格式变化时加一；解码遇到不认识的版本直接当作没有进行中的游戏
+GAME_STATE_VERSION = 3
+
+# 提示种类
+HINT_TAG = 0    # 效果标签，值为 CATEGORY_TAGS 的编号
+HINT_CHAR = 1   # 卡名中的一个字
+HINT_SET = 2    # 系列名
+HINT_ATTR = 3   # 属性，值为数据库里的 attribute
+
+
+def hint_text(kind, value):
+    if kind == HINT_TAG:
+        return f"提示：目标卡有效果标签 “{CATEGORY_TAGS[value]}”"
+    if kind == HINT_CHAR:
+        return f"提示：目标卡名称中包含 “{value}” 这个字"
+    if kind == HINT_SET:
+        return f"提示：目标卡属于 “{value}” 系列"
+    if kind == HINT_ATTR:
+        return f"提示：目标卡的属性是 “{ATTR_MAP.get(value, f'0x{value:X}')}”"
+    raise ValueError(f"未知的提示种类：{kind}")
+
+
+class GameState:
+    """
+    一局游戏的全部状态，只包含整数 id 和少量标量：
+
+      mode / max_attempts / policy：开局时选择的题库、猜测次数和抽题方式（见 sampling.POLICIES）
+      target_id：答案的卡片 id，None 表示本局已结束、下次访问时重新抽题
+      previous_id：上一局的答案，stratified 抽题时避开它所在的分层
+      perm：norepeat 抽题的 [n, key, cursor]（见 sampling.new_permutation），None 表示还没开始
+      guess_count：本局已提交的猜测次数（包括没有匹配到卡片的输入）
+      guesses：猜过的卡片 id
+      hints：已给出的提示 (种类, 值)
+
+    卡名、对比结果、提示文字都由卡片 id 从预先算好的标签表里推出来，不存进会话。
+    """
+
+    __slots__ = ("mode", "max_attempts", "target_id", "guess_count", "guesses", "hints",
+                 "policy", "previous_id", "perm")
+
+    def __init__(self, mode, max_attempts=5, target_id=None, guess_count=0, guesses=(), hints=(),
+                 policy="uniform", previous_id=None, perm=None):
+        self.mode = mode
+        self.max_attempts = max_attempts
+        self.target_id = target_id
+        self.guess_count = guess_count
+        self.guesses = array("q", guesses)
+        self.hints = [tuple(h) for h in hints]
+        self.policy = policy
+        self.previous_id = previous_id
+        self.perm = list(perm) if perm else None
+
+    def encode(self):
+        """编码成可 JSON 序列化的紧凑列表，第一个元素是版本号"""
+        return [
+            GAME_STATE_VERSION, self.mode, self.max_attempts, self.target_id,
+            self.guess_count, self.guesses.tolist(), [list(h) for h in self.hints],
+            self.policy, self.previous_id, self.perm,
+        ]
+
+    @classmethod
+    def decode(cls, data):
+        """encode() 的逆操作；数据缺失、版本不符或格式损坏时返回 None"""
+        if not isinstance(data, list) or not data or data[0] != GAME_STATE_VERSION:
+            return None
+        try:
+            _, mode, max_attempts, target_id, guess_count, guesses, hints, policy, previous_id, perm = data
+            return cls(mode, max_attempts, target_id, guess_count, guesses, hints, policy, previous_id, perm)
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def in_progress(self):
+        return self.target_id is not None
+
+    def new_round(self, target_id):
+        self.target_id = target_id
+        self.guess_count = 0
+        self.guesses = array("q")
+        self.hints = []
+
+    def end_round(self):
+        if self.target_id is not None:
+            self.previous_id = self.target_id
+        self.target_id = None
+
+    def add_hint(self, kind, value):
+        self.hints.append((kind, value))
+
+    def hint_texts(self):
+        return [hint_text(kind, value) for kind, value in self.hints]
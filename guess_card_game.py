@@ -1,250 +1,468 @@
 import os
-import random
 import sys
+import time
+
+_import_start = time.perf_counter()
 
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify
 
-from data_utils import load_card_database, card_to_tags, compare_tags
+from data_utils import COMPARE_FIELDS, load_card_data
+from card_store import CardStore
+from daily import DAILY_SEED, DailySchedule, seed_from_secret
+from game_state import GameState
+from sampling import POLICIES, draw_target
+from session_store import ServerSideSessionInterface, make_session_store
+import metrics
+import reloader
+import rooms
+import startup
+from metrics import stage
+
+startup.record("imports", time.perf_counter() - _import_start)
 
 base_path = getattr(sys, "_MEIPASS", os.path.dirname(__file__))
 template_folder = os.path.join(base_path, "templates")
 
-app = Flask(__name__, template_folder=template_folder)
-db = None
-target_row = None
-app.secret_key = os.getenv("SECRET_KEY", "你自己的随机 Secret Key")
+# 联想下拉框最多返回多少个卡名
+SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", 20))
+# 猜测找不到卡时最多给出几个“你是不是要找”的建议
+DID_YOU_MEAN_LIMIT = 3
+# 第几次猜测之后自动给一条提示
+HINT_AT_GUESSES = (2, 5)
+# CARDS_PRELOAD=1 时 create_app() 里就加载卡片数据和索引（gunicorn 在 master 里预加载后再 fork）；
+# 默认第一次用到时才加载，进程启动后马上就能监听端口
+CARDS_PRELOAD = os.getenv("CARDS_PRELOAD", "0") == "1"
 
-db = load_card_database()
+# 题库、标签表和索引在第一次用到时（或 preload 时）一次性建好；重新加载数据库时调用 store.rebuild(new_db)
+# 有新鲜的 cards.snapshot/ 时直接从快照加载（python snapshot.py 生成）
+store = CardStore(loader=load_card_data)
+# 每日一题：所有人同一个答案，当天的对比结果整表预先算好
+daily = DailySchedule(store)
+
+
+def compare(guess_id, target_id):
+    """今日每日一题的答案直接查预先算好的表，其他情况走 store 的带缓存对比"""
+    html = daily.compare(guess_id, target_id)
+    return html if html is not None else store.compare(guess_id, target_id)
+
+
+def verdicts(guess_id, target_id):
+    result = daily.verdicts(guess_id, target_id)
+    return result if result is not None else store.verdicts(guess_id, target_id)
+
+
+def next_target(state):
+    """每日一题取今天的答案，其他模式按 state.policy 抽题"""
+    if state.mode == 'daily':
+        return daily.today().target_id
+    return draw_target(store.pool(state.mode), state)
+
+
+def remaining(state):
+    """本局还有多少张卡与目前的对比结果和提示都相容；本局已结束时返回 None"""
+    if not state.in_progress:
+        return None
+    with stage("solver"):
+        return store.remaining(state.mode, state.target_id, state.guesses.tolist(), state.hints)
+
+
+def warmth(mode, guess_id, target_id):
+    """接近度百分比（0~100），算不出来时返回 None"""
+    with stage("similarity"):
+        value = store.warmth(mode, guess_id, target_id)
+    return None if value is None else round(value * 100)
+
+
+def history_rows(history, target_id, mode):
+    """把猜测 id 列表还原成模板需要的 {guess_name, compare, warmth}"""
+    return [
+        {"guess_name": store.tags(gid)["卡名"], "compare": compare(gid, target_id), "warmth": warmth(mode, gid, target_id)}
+        for gid in history
+    ]
+
+
+def load_state():
+    """从会话里解码本局状态，没有开局（或编码版本已过时）时返回 None"""
+    return GameState.decode(session.get("game"))
+
+
+def save_state(state):
+    session["game"] = state.encode()
+
+
+def new_game(form):
+    """按开局表单（或 JSON）新开一局，写进会话并返回 state"""
+    # 1. 读卡片类型
+    mode = form["mode"]
+
+    # 2. 读猜测次数（range 滑块传回的是字符串）
+    try:
+        max_attempts = int(form.get("attempts", 5))
+    except (TypeError, ValueError):
+        max_attempts = 5
+
+    # 3. 读抽题方式，未知的按均匀随机处理
+    policy = form.get("policy", "uniform")
+    if policy not in POLICIES:
+        policy = "uniform"
+
+    # 4. 初始化 session，并按抽题方式选一个目标卡片 ID
+    session.clear()
+    state = GameState(mode, max_attempts, policy=policy)
+    state.new_round(next_target(state))
+    save_state(state)
+    return state
 
 
-def filter_db(mode):
-    """
-    mode: 'monster' | 'spell' | 'trap' | 'hot' | 'all'
-    """
-    if mode == 'monster':
-        # 怪兽卡 & 排除通常怪兽
-        mask = ((db['type'] & 0x1) > 0) & ((db['type'] & 0x10) == 0)
-        return db[mask]
-    if mode == 'spell':
-        return db[(db['type'] & 0x2) > 0]
-    if mode == 'trap':
-        return db[(db['type'] & 0x4) > 0]
-    if mode == 'hot':
-        mask = ((db['type'] & 0x1) > 0) & ((db['type'] & 0x10) == 0) & (db['hot'] == 1)
-        return db[mask]
-    # all
-    return db
-
-
-@app.route("/", methods=["GET", "POST"])
 def start():
     """游戏开始前，选择卡牌范围和猜测次数"""
     if request.method == "POST":
-        # 1. 读卡片类型
-        mode = request.form["mode"]
-
-        # 2. 读猜测次数（range 滑块传回的是字符串）
-        try:
-            max_attempts = int(request.form.get("attempts", 5))
-        except ValueError:
-            max_attempts = 5
-
-        # 3. 初始化 session
-        session.clear()
-        session["mode"] = mode
-        session["max_attempts"] = max_attempts
-        session["guess_count"] = 0
-        session["hints_shown"] = []
-
-        # 4. 随机选一个目标卡片 ID
-        pool = filter_db(mode)
-        session["target_id"] = int(pool.sample(1).index[0])
-
+        new_game(request.form)
         return redirect(url_for("game"))
 
     # GET：渲染 start.html（包含滑块）
-    return render_template("start.html")
+    return render_template("start.html", rooms=rooms.ROOMS_ENABLED)
+
+
+def ensure_round(state):
+    """本局已结束（或刚切换题库）时抽一张新的目标卡"""
+    if not state.in_progress:
+        state.new_round(next_target(state))
+        save_state(state)
+
+
+def submit_guess(state, user_input):
+    """
+    处理一次猜测并更新 state（调用方负责 save_state），返回结果：
+      {"status": "exhausted"}                  猜测次数已用尽，本局结束
+      {"status": "not_found", "query": ..., "suggestions": [...]}
+                                               题库里没有匹配的卡，suggestions 为模糊匹配的卡名建议
+      {"status": "correct" | "wrong", "guess_id": ...}
+    """
+    target_id = state.target_id
+    state.guess_count += 1
+
+    if state.guess_count > state.max_attempts:
+        state.end_round()
+        return {"status": "exhausted"}
+
+    user_input = user_input.strip()
+    # 先按规范化卡名精确查找，再退回前缀/子串匹配；拼音/错字模糊匹配只作为建议，不算作猜测
+    with stage("match"):
+        guess_id = store.resolve(state.mode, user_input)
+        if guess_id is None:
+            suggestions = store.did_you_mean(state.mode, user_input, DID_YOU_MEAN_LIMIT)
+    if guess_id is None:
+        return {"status": "not_found", "query": user_input, "suggestions": suggestions}
+
+    state.guesses.append(guess_id)
+    if guess_id == target_id:
+        state.end_round()
+        return {"status": "correct", "guess_id": guess_id}
+
+    # —— 第二、五次猜测各给一条提示 —— #
+    if len(state.guesses) in HINT_AT_GUESSES:
+        give_hint(state)
+
+    return {"status": "wrong", "guess_id": guess_id}
+
+
+def not_found_message(result):
+    """找不到卡时的提示文字，附上模糊匹配的建议"""
+    text = f"未找到包含“{result['query']}”的卡片。"
+    if result["suggestions"]:
+        text += f"你是不是要找：{' / '.join(result['suggestions'])}？"
+    return text
+
+
+def give_hint(state):
+    """
+    从效果标签、系列、属性、卡名里的字中挑一条最能缩小候选范围的提示（见 hints.choose_hint）；
+    没有可提示的返回 False
+    """
+    puzzle = daily.lookup(state.target_id)
+    with stage("solver"):
+        hint = store.best_hint(
+            state.mode, state.target_id, state.guesses.tolist(), state.hints,
+            puzzle.hint_chars if puzzle is not None else None,
+        )
+    if hint is None:
+        return False
+    state.add_hint(*hint)
+    return True
 
 
-@app.route("/game", methods=["GET", "POST"])
 def game():
     feedback = None
-    mode = session.get('mode')
-    if not mode:
+    state = load_state()
+    if state is None:
         return redirect(url_for("start"))
+    ensure_round(state)
 
-    if 'target_id' not in session:
-        pool = filter_db(mode)
-        session['target_id'] = int(pool.sample(1).index[0])
-        session['history'] = []
-        session['hints'] = []
-        session['hinted_chars'] = []
-    max_attempts = session.get('max_attempts', 5)
-    guess_count = session.get('guess_count', 0)
-
-    filtered = filter_db(mode)
-    target = db.loc[session['target_id']]
-
-    # 本局历史记录和提示
-    history = session.get('history', [])
-    hints = session.get('hints', [])
-    hinted_chars = session.get('hinted_chars', [])
+    target_id = state.target_id
+    # 标签在加载时已经算好，这里只是查表
+    target = store.tags(target_id)
+    # 本局历史记录（猜过的卡片 id，渲染前的快照）
+    history = state.guesses.tolist()
 
     if request.method == "POST":
         action = request.form.get("action", "guess")
 
         if action == "change_mode":
-            new_mode = request.form.get("mode")
-            session['mode'] = new_mode
-            # 直接把上一行 target_id 删掉，触发上面自动重置
-            session.pop('target_id', None)
+            state.mode = request.form.get("mode")
+            # 结束本局，下次访问时按新题库重新抽题（不重复抽题从新题库重新开始）
+            state.end_round()
+            state.perm = None
+            save_state(state)
             return redirect(url_for("game"))
 
         if action == "surrender":
-            # 认输
-            # 1. 先做一次对比
-            compare = compare_tags(card_to_tags(target), card_to_tags(target))
-            # 2. 把这条全绿记录追加到本局历史
-            history.append({
-                "guess_name": target['name'],
-                "compare": compare
-            })
-            # 3. 带上 compare 和 hints 给模板渲染
-            feedback = {"giveup": True, "answer": target["name"], "compare": compare, "hints": hints}
-            session.pop('target_id', None)
-            session.pop('history', None)
-            session.pop('hints', None)
-            session.pop('hinted_chars', None)
+            # 认输：把一条全绿记录追加到本局历史，带上 compare 和 hints 给模板渲染
+            history.append(target_id)
+            feedback = {
+                "giveup": True,
+                "answer": target["卡名"],
+                "compare": compare(target_id, target_id),
+                "hints": state.hint_texts()
+            }
+            state.end_round()
+            save_state(state)
 
         elif action == "restart":
             # 重新开始
-            session.pop('target_id', None)
-            session.pop('mode', None)
-            session.pop('history', None)
-            session.pop('hints', None)
-            session.pop('hinted_chars', None)
+            session.clear()
             return redirect(url_for("game"))
 
         else:
             # 普通猜测
-            guess_count += 1
-            session['guess_count'] = guess_count
+            result = submit_guess(state, request.form.get("guess", ""))
+            save_state(state)
+            hints = state.hint_texts()
 
-            if guess_count > max_attempts:
+            if result["status"] == "exhausted":
                 feedback = {
-                    "error": f"😢 猜测次数已用尽！答案是【{target['name']}】",
+                    "error": f"😢 猜测次数已用尽！答案是【{target['卡名']}】",
                     "giveup": True,
-                    "answer": target["name"],
+                    "answer": target["卡名"],
                     "hints": hints
                 }
-                for key in ('target_id', 'history', 'hints', 'hinted_chars', 'guess_count'):
-                    session.pop(key, None)
-                return render_template(
-                    "index.html",
-                    feedback=feedback,
-                    history=history,
-                    hints=hints,
-                    mode=mode,
-                    guess_count=guess_count,
-                    max_attempts=max_attempts
-                )
-
-            user_input = request.form.get("guess", "").strip()
-            match = filtered[filtered["name"].str.contains(user_input, case=False, na=False)]
-
-            if match.empty:
-                feedback = {"error": f"未找到包含“{user_input}”的卡片。", "hints": hints}
-
+            elif result["status"] == "not_found":
+                feedback = {"error": not_found_message(result), "hints": hints}
             else:
-                guess = match.iloc[0]
-                if guess.name == target.name:
-                    # 1. 先做一次对比
-                    compare = compare_tags(card_to_tags(guess), card_to_tags(target))
-                    # 2. 把这条全绿记录追加到本局历史
-                    history.append({
-                        "guess_name": guess['name'],
-                        "compare": compare
-                    })
-                    # 3. 带上 compare 和 hints 给模板渲染
+                guess_id = result["guess_id"]
+                guess = store.tags(guess_id)
+                result_html = compare(guess_id, target_id)
+                history.append(guess_id)
+                if result["status"] == "correct":
                     feedback = {
-                        "success": f"🎉 恭喜你猜中了！答案就是【{guess['name']}】",
-                        "compare": compare,
+                        "success": f"🎉 恭喜你猜中了！答案就是【{guess['卡名']}】",
+                        "compare": result_html,
                         "hints": hints
                     }
-                    # 清理本局 session
-                    session.pop('target_id', None)
-                    session.pop('history', None)
-                    session.pop('hints', None)
-                    session.pop('hinted_chars', None)
-
                 else:
-                    # 对比并入历史
-                    compare = compare_tags(card_to_tags(guess), card_to_tags(target))
-                    history.append({
-                        "guess_name": guess['name'],
-                        "compare": compare
-                    })
-
-                    # —— 第二次猜测，给一个新的“效果标签”提示 —— #
-                    if len(history) == 2:
-                        target_tags = set(card_to_tags(target)["效果标签"])
-                        guessed_tags = set()
-                        for h in history:
-                            # history 里保存的 compare 里没有原始 list，
-                            # 所以直接重新取一次 guess 的原始标签：
-                            row = db[db["name"] == h["guess_name"]].iloc[0]
-                            guessed_tags |= set(card_to_tags(row)["效果标签"])
-                        remaining = list(target_tags - guessed_tags)
-                        if remaining:
-                            tag_hint = random.choice(remaining)
-                            hints.append(f"提示：目标卡有效果标签 “{tag_hint}”")
-
-                    # —— 第五次猜测，给一个新的名称字符提示 —— #
-                    if len(history) == 5:
-                        name_chars = [c for c in target["name"] if c.strip()]
-                        candidates = [c for c in name_chars if c not in hinted_chars]
-                        if candidates:
-                            char_hint = random.choice(candidates)
-                            hinted_chars.append(char_hint)
-                            hints.append(f"提示：目标卡名称中包含 “{char_hint}” 这个字")
-
-                    # 更新 session
-                    session['history'] = history
-                    session['hints'] = hints
-                    session['hinted_chars'] = hinted_chars
-
                     feedback = {
-                        "compare": compare,
-                        "guess_name": guess['name'],
+                        "compare": result_html,
+                        "guess_name": guess['卡名'],
                         "hints": hints
                     }
 
-    return render_template(
-        "index.html",
-        feedback=feedback,
-        history=history,
-        hints=hints,
-        mode=mode,
-        guess_count=guess_count,
-        max_attempts=max_attempts
-    )
+    rows = history_rows(history, target_id, state.mode)
+    with stage("render_template"):
+        return render_template(
+            "index.html",
+            feedback=feedback,
+            history=rows,
+            hints=state.hint_texts(),
+            mode=state.mode,
+            guess_count=state.guess_count,
+            max_attempts=state.max_attempts,
+            remaining=remaining(state)
+        )
+
+
+def row_payload(guess_id, target_id, mode):
+    """一行对比结果：{id, name, row: {字段: HTML}, warmth: 接近度百分比}"""
+    return {
+        "id": guess_id,
+        "name": store.tags(guess_id)["卡名"],
+        "row": compare(guess_id, target_id),
+        "warmth": warmth(mode, guess_id, target_id),
+    }
+
+
+def state_payload(state):
+    return {
+        "mode": state.mode,
+        "guess_count": state.guess_count,
+        "max_attempts": state.max_attempts,
+        "finished": not state.in_progress,
+        "remaining": remaining(state),
+    }
+
+
+# —— JSON 接口：页面用 fetch 调用，每次只返回新增的一行和新增的提示，不重新渲染整页 —— #
+
+def api_start():
+    """请求体同开局表单：{"mode": ..., "attempts": ..., "policy": ...}"""
+    payload = request.get_json(silent=True) or request.form
+    if payload.get("mode") is None:
+        return jsonify({"error": "no_mode"}), 400
+    return jsonify(state_payload(new_game(payload)))
+
+
+def api_state():
+    """整局状态（页面首次加载或断线重连时用），包括历史记录和全部提示"""
+    state = load_state()
+    if state is None:
+        return jsonify({"error": "no_game"}), 400
+    ensure_round(state)
+    body = state_payload(state)
+    body["hints"] = state.hint_texts()
+    body["history"] = [row_payload(gid, state.target_id, state.mode) for gid in state.guesses.tolist()]
+    return jsonify(body)
+
+
+def api_guess():
+    """
+    JSON 版猜测接口：请求体 {"guess": "卡名"}（也接受表单），返回：
+      status / guess_count / max_attempts / finished
+      hints：这次新增的提示
+      guess_id / guess_name / row：新的一行（{字段: HTML}）
+      warmth：这次猜测与答案的接近度（0~100，越大越像）
+      suggestions：找不到卡（status 为 not_found）时模糊匹配的卡名建议
+      fields / verdicts：同一行的判定代码，含义见 data_utils 里的 V_* / DIR_*
+      answer：本局结束时的答案
+    """
+    state = load_state()
+    if state is None:
+        return jsonify({"error": "no_game"}), 400
+    ensure_round(state)
+    target_id = state.target_id
+    hint_count = len(state.hints)
+
+    payload = request.get_json(silent=True) or request.form
+    result = submit_guess(state, str(payload.get("guess", "")))
+    save_state(state)
+
+    body = state_payload(state)
+    body["status"] = result["status"]
+    body["hints"] = state.hint_texts()[hint_count:]
+    if "suggestions" in result:
+        body["suggestions"] = result["suggestions"]
+    if "guess_id" in result:
+        guess_id = result["guess_id"]
+        codes = verdicts(guess_id, target_id)
+        body["guess_id"] = guess_id
+        body["guess_name"] = store.tags(guess_id)["卡名"]
+        body["row"] = compare(guess_id, target_id)
+        body["warmth"] = warmth(state.mode, guess_id, target_id)
+        body["fields"] = COMPARE_FIELDS
+        body["verdicts"] = [codes[key] for key in COMPARE_FIELDS]
+    if not state.in_progress:
+        body["answer"] = store.tags(target_id)["卡名"]
+    return jsonify(body)
+
+
+def api_surrender():
+    """认输：返回答案和答案自己的一行（全绿）"""
+    state = load_state()
+    if state is None:
+        return jsonify({"error": "no_game"}), 400
+    ensure_round(state)
+    target_id = state.target_id
+    state.end_round()
+    save_state(state)
+    body = state_payload(state)
+    body.update(row_payload(target_id, target_id, state.mode))
+    body["answer"] = body["name"]
+    return jsonify(body)
+
+
+def api_hint():
+    """
+    主动要一个提示，消耗一次猜测次数（至少要留一次给猜测）：
+    和自动提示一样挑最能缩小候选范围的一条。返回 {status, hints: 新增的提示}
+    """
+    state = load_state()
+    if state is None:
+        return jsonify({"error": "no_game"}), 400
+    ensure_round(state)
+    if state.guess_count + 1 >= state.max_attempts:
+        return jsonify({"status": "no_attempts", "hints": []})
+    hint_count = len(state.hints)
+    if not give_hint(state):
+        return jsonify({"status": "none", "hints": []})
+    state.guess_count += 1
+    save_state(state)
+    body = state_payload(state)
+    body["status"] = "ok"
+    body["hints"] = state.hint_texts()[hint_count:]
+    return jsonify(body)
 
 
-@app.route("/suggest")
 def suggest():
     q = request.args.get("q", "").strip()
     if not q:
         return jsonify([])
-    mode = session.get('mode', 'all')
-    pool = filter_db(mode)
-    matches = pool[
-        pool["name"].str.contains(q, case=False, na=False)
-    ]["name"].tolist()
-    return jsonify(matches)
+    state = load_state()
+    mode = state.mode if state else 'all'
+    with stage("match"):
+        names = store.suggest(mode, q, SUGGEST_LIMIT)
+    return jsonify(names)
+
+
+def create_app(preload=CARDS_PRELOAD):
+    """
+    建 Flask 应用并挂上会话、耗时统计、重新加载、多人对战和各个路由；不读卡片数据库。
+    preload=True 时立即加载卡片数据和索引（STARTUP_REPORT=1 时打印分阶段启动耗时），
+    否则推迟到第一个用到数据的请求。开启多人对战时 socket.io 实例在 app.extensions["socketio"]。
+    """
+    app = Flask(__name__, template_folder=template_folder)
+    secret_key = os.getenv("SECRET_KEY")
+    app.secret_key = secret_key or "你自己的随机 Secret Key"
+    # 游戏状态保存在服务端（默认进程内 LRU，SESSION_BACKEND=redis 时用 redis），
+    # cookie 里只有会话 id
+    app.session_interface = ServerSideSessionInterface(make_session_store())
+    # METRICS=1 时按路由、按阶段统计耗时，暴露 /metrics；SLOW_REQUEST_MS 打印慢请求明细
+    metrics.init_app(app)
+    # 每日一题的排期种子：DAILY_SEED，没有时由 SECRET_KEY 派生（仓库里的默认值是公开的，不能用）
+    daily.configure(DAILY_SEED or (secret_key and seed_from_secret(secret_key)))
+    # cards.cdb 变化（CARDS_WATCH_INTERVAL）或调用 /admin/reload（ADMIN_TOKEN）时在后台重新加载
+    reloader.init_app(app, store)
+    # 多人对战房间（socket.io），ROOMS / SOCKETIO_ASYNC_MODE / SOCKETIO_MESSAGE_QUEUE 见 rooms.py
+    if rooms.ROOMS_ENABLED:
+        rooms.init_app(app, store)
+
+    app.add_url_rule("/", "start", start, methods=["GET", "POST"])
+    app.add_url_rule("/game", "game", game, methods=["GET", "POST"])
+    app.add_url_rule("/api/start", "api_start", api_start, methods=["POST"])
+    app.add_url_rule("/api/state", "api_state", api_state)
+    app.add_url_rule("/api/guess", "api_guess", api_guess, methods=["POST"])
+    app.add_url_rule("/api/surrender", "api_surrender", api_surrender, methods=["POST"])
+    app.add_url_rule("/api/hint", "api_hint", api_hint, methods=["POST"])
+    app.add_url_rule("/suggest", "suggest", suggest)
+
+    if preload:
+        store.load()
+    return app
+
+
+def __getattr__(name):
+    """guess_card_game:app（gunicorn）和 from guess_card_game import app 第一次用到时才建默认应用"""
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
     host = "0.0.0.0"
     port = int(os.environ.get("PORT", 5000))
 
-    app.run(host=host, port=port, debug=False)
+    app = create_app()
+    socketio = app.extensions.get("socketio")
+    if socketio is not None:
+        socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
+    else:
+        app.run(host=host, port=port, debug=False)
@@ -0,0 +1,58 @@
+# gunicorn.conf.py — 生产环境多进程部署
+#
+#   gunicorn -c gunicorn.conf.py guess_card_game:app
+#
+# preload_app 让 master 进程先 import guess_card_game 建好应用，CARDS_PRELOAD=1 让它同时把卡片数据库、
+# 题库、标签表和索引全部建好（默认是第一次用到时才加载），再 fork 出各个 worker。
+# 这些数据之后只读，worker 之间通过写时复制共享同一份物理内存，
+# 每多开一个 worker 只增加它自己的请求处理开销。
+# 用 python worker_rss.py 查看 master 和每个 worker 的 RSS / PSS。
+#
+# 多人对战（socket.io 长连接）需要 gevent worker（默认）：单个进程就能挂住数千个空闲连接。
+# 房间状态和 socket.io 会话都在进程内存里，同一个 gunicorn 的多个 worker 之间没有粘性路由，
+# 所以开启多人对战时只能有一个 worker（要多进程就起多个实例，在负载均衡里按房间号分流）；
+# 多个 worker 时请设置 ROOMS=0 关掉多人对战。
+
+import gc
+import os
+
+os.environ.setdefault("CARDS_PRELOAD", "1")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+if worker_class == "gevent":
+    # 必须在 preload 应用之前打补丁，否则应用里建的锁和线程仍是原生的
+    from gevent import monkey
+    monkey.patch_all()
+    os.environ.setdefault("SOCKETIO_ASYNC_MODE", "gevent")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+preload_app = True
+pidfile = os.environ.get("GUNICORN_PIDFILE", "/tmp/yugioh-ccb.pid")
+accesslog = "-"
+
+
+def when_ready(server):
+    from rooms import ROOMS_ENABLED
+    from session_store import session_backend
+
+    # 进程内会话存储不在 worker 之间共享，请求落到别的 worker 上对局就丢了：直接拒绝启动
+    # （gunicorn 把 RuntimeError 打印出来后以状态 1 退出）
+    if workers > 1 and session_backend() == "memory":
+        raise RuntimeError(
+            "进程内会话存储不在 worker 之间共享：多 worker 部署请设置 REDIS_URL（或 SESSION_BACKEND=redis），"
+            "否则设置 WEB_CONCURRENCY=1"
+        )
+    # sync worker 被一个长轮询连接占满，多个 worker 之间 socket.io 会话也不通（invalid session）
+    if ROOMS_ENABLED and (worker_class != "gevent" or workers > 1):
+        raise RuntimeError(
+            "多人对战需要 GUNICORN_WORKER_CLASS=gevent 且 WEB_CONCURRENCY=1；"
+            "用 sync worker 或多个 worker 部署时请设置 ROOMS=0"
+        )
+    # 应用已在 master 里加载完毕：把现存对象移出 GC 跟踪，
+    # 避免 worker 里的垃圾回收遍历它们、写脏共享页面
+    gc.freeze()
+    server.log.info("卡片数据已预加载，已冻结 %d 个对象", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    server.log.info("worker %s 已启动（共享 master 预加载的卡片数据）", worker.pid)
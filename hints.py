@@ -0,0 +1,71 @@
+import os
+import random
+from math import log2
+
+import numpy as np
+
+from game_state import HINT_ATTR, HINT_CHAR, HINT_SET, HINT_TAG
+from map import ATTR_MAP, CATEGORY_TAGS
+
+# 提示尽量至少留下这么多张候选卡，避免一条提示直接把答案交出去
+HINT_MIN_REMAINING = int(os.getenv("HINT_MIN_REMAINING", 2))
+
+# 这些题库的提示优先“留住”与答案最相似的 HINT_DISTRACTORS 张候选卡，让提示更难直接锁定答案
+DISTRACTOR_MODES = ('hard',)
+HINT_DISTRACTORS = int(os.getenv("HINT_DISTRACTORS", 8))
+
+CATEGORY_CODE_LIST = list(CATEGORY_TAGS)
+
+
+def hint_options(solver, target_row, setnames, name_chars):
+    """
+    答案身上所有可以作为提示的事实（效果标签、属性、系列、卡名里的字）：
+    [((种类, 值), 具有该事实的卡的掩码), ...]，每个掩码都是一次向量运算。
+    只给答案这类卡确实有的字段：魔法、陷阱没有属性（数据库里是 0），不出属性提示。
+    """
+    options = []
+    category = solver.category
+    for col in np.flatnonzero(category[target_row]).tolist():
+        options.append(((HINT_TAG, CATEGORY_CODE_LIST[col]), category[:, col]))
+
+    attribute = int(solver.attribute[target_row])
+    if attribute in ATTR_MAP:
+        options.append(((HINT_ATTR, attribute), solver.attribute == attribute))
+
+    for name in setnames:
+        options.append(((HINT_SET, name), solver.setname_mask(name)))
+
+    for ch in dict.fromkeys(name_chars):
+        options.append(((HINT_CHAR, ch), solver.char_mask(ch)))
+    return options
+
+
+def choose_hint(solver, mask, target_id, target_tags, name_chars=None, given=(), rng=random,
+                min_remaining=HINT_MIN_REMAINING, distractors=None):
+    """
+    mask 为当前的候选集合（CardStore.candidates），target_tags 为答案的标签，
+    name_chars 为可以提示的字（默认取卡名里的非空白字符），given 为已给出的提示。
+    在所有还没给过的提示里选信息量 log2(候选数 / 提示后剩余数) 最大的一条，返回 (种类, 值)。
+    优先选提示后仍剩至少 min_remaining 张的，都不满足时才允许直接缩到答案；
+    传入 distractors（与答案最相似的候选卡的掩码）时先比提示后还留下几张，再比信息量。
+    没有任何能缩小候选集合的提示（或答案已不在数据库里）时返回 None。并列的随机选一条。
+    """
+    target_row = solver.row_of(target_id)
+    if target_row is None:
+        return None
+    if name_chars is None:
+        name_chars = [c for c in target_tags["卡名"] if c.strip()]
+    total = int(np.count_nonzero(mask))
+    given = set(given)
+    scored = []
+    for hint, has in hint_options(solver, target_row, target_tags["系列"], name_chars):
+        left = int(np.count_nonzero(has & mask))
+        if hint in given or not 0 < left < total:
+            continue
+        kept = int(np.count_nonzero(has & distractors)) if distractors is not None else 0
+        scored.append(((kept, log2(total / left)), left, hint))
+    if not scored:
+        return None
+    preferred = [item for item in scored if item[1] >= min_remaining] or scored
+    best = max(score for score, _, _ in preferred)
+    return rng.choice([hint for score, _, hint in preferred if score == best])
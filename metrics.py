@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, has_request_context, request
+
+# METRICS=1 时开启分阶段计时和 /metrics；关闭时 timed() 直接返回原函数，stage() 返回空上下文
+ENABLED = os.getenv("METRICS", "0") == "1"
+# 整个请求超过这么多毫秒时打印分阶段耗时，0 表示不记录慢请求
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))
+# 直方图桶上界（秒）
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+logger = logging.getLogger("ccb.slow")
+
+
+class Histogram:
+    """Prometheus 风格的累积直方图"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+    """按 (指标名, 标签) 保存直方图；多线程下由一把锁保护"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def render(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            items = sorted(self._histograms.items())
+            seen = set()
+            for (name, labels), hist in items:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                sep = "," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label_text}{sep}le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label_text}}} {hist.sum:.6f}")
+                lines.append(f"{name}_count{{{label_text}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _remember_route():
+    """请求匹配到的路由规则（如 /game），记到 environ 里给中间件打标签用"""
+    rule = request.url_rule
+    request.environ["ccb.route"] = rule.rule if rule is not None else "unmatched"
+
+
+def record_stage(name, seconds):
+    """
+    请求内的阶段耗时先累加到 environ，等请求结束、路由确定后由中间件统一记入直方图
+    （会话在路由匹配之前就已读取）；请求之外的调用直接记在 route="offline" 下。
+    """
+    if has_request_context():
+        stages = request.environ.setdefault("ccb.stages", {})
+        stages[name] = stages.get(name, 0.0) + seconds
+    else:
+        registry.observe("ccb_stage_seconds", (("route", "offline"), ("stage", name)), seconds)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """with stage("match"): ... —— 统计一段代码的耗时"""
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def timed(name):
+    """函数装饰器版的 stage()；关闭时原样返回函数，没有任何额外开销"""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_stage(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    包在 app.wsgi_app 外面统计整个请求（包括会话读写）的耗时，
+    并在超过 SLOW_REQUEST_MS 时输出分阶段明细。
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = environ.get("ccb.route", "unmatched")
+            stages = environ.get("ccb.stages", {})
+            registry.observe("ccb_request_seconds", (("route", route),), elapsed)
+            for name, seconds in stages.items():
+                registry.observe("ccb_stage_seconds", (("route", route), ("stage", name)), seconds)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                breakdown = ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in sorted(stages.items(), key=lambda kv: -kv[1]))
+                logger.warning("慢请求 %s %s %.1fms：%s", environ.get("REQUEST_METHOD"),
+                               environ.get("PATH_INFO"), elapsed * 1000, breakdown or "无分阶段数据")
+
+
+def init_app(app):
+    """开启时注册 /metrics、记录路由名并挂上计时中间件"""
+    if not ENABLED:
+        return
+
+    app.before_request(_remember_route)
+
+    def metrics_view():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
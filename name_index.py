@@ -0,0 +1,110 @@
+import unicodedata
+from bisect import bisect_left
+
+
+def normalize_name(text):
+    """
+    索引和查询共用的规范化键：
+      · NFKC：全角字母、数字、标点转半角（Ｎｏ．３９ → No.39）
+      · casefold：忽略大小写
+      · 去掉所有空白（包括全角空格）
+    """
+    return "".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class NameIndex:
+    """
+    卡名的字符倒排索引，启动时按题库各建一份。
+
+    · exact：规范化卡名 → 位置列表，用于完全匹配（提交猜测时的 O(1) 查找）
+    · sorted_keys：按规范化卡名排序的 (卡名, 位置)，二分查找前缀
+    · postings：字符 → 含该字符的卡名位置集合，求交集后再校验子串
+
+    查询结果按 完全匹配 → 前缀匹配 → 子串匹配 排序，
+    同一档内保持原 DataFrame 的顺序（即按 id 升序）。
+    """
+
+    def __init__(self, names, ids=None):
+        self.names = list(names)
+        self.ids = list(ids) if ids is not None else list(range(len(self.names)))
+        self.keys = [normalize_name(n) for n in self.names]
+
+        self.exact = {}
+        self.postings = {}
+        for pos, key in enumerate(self.keys):
+            self.exact.setdefault(key, []).append(pos)
+            for ch in set(key):
+                self.postings.setdefault(ch, []).append(pos)
+        # 倒排表冻结成 frozenset，求交集时不再复制
+        self.postings = {ch: frozenset(p) for ch, p in self.postings.items()}
+        self.sorted_keys = sorted((key, pos) for pos, key in enumerate(self.keys))
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_frame(cls, df):
+        """从 load_card_database() 返回的 DataFrame 或 CardTable（或其子集）构建"""
+        return cls(df["name"].tolist(), df.index.tolist())
+
+    def _prefix_positions(self, key):
+        # 从二分查找的位置按下标往后走，只访问前缀匹配的那几项，不复制列表的剩余部分
+        keys = self.sorted_keys
+        out = []
+        for i in range(bisect_left(keys, (key,)), len(keys)):
+            k, pos = keys[i]
+            if not k.startswith(key):
+                break
+            out.append(pos)
+        return out
+
+    def _substring_positions(self, key):
+        lists = []
+        for ch in set(key):
+            p = self.postings.get(ch)
+            if not p:
+                return []
+            lists.append(p)
+        lists.sort(key=len)
+        candidates = lists[0].intersection(*lists[1:]) if len(lists) > 1 else lists[0]
+        return [pos for pos in sorted(candidates) if key in self.keys[pos]]
+
+    def search_positions(self, query, limit=None):
+        """返回排好序的位置列表（完全 → 前缀 → 子串），最多 limit 个"""
+        key = normalize_name(query)
+        if not key:
+            return []
+
+        ranked = list(self.exact.get(key, ()))
+        seen = set(ranked)
+        for tier in (self._prefix_positions, self._substring_positions):
+            if limit is not None and len(ranked) >= limit:
+                break
+            for pos in sorted(tier(key)):
+                if pos not in seen:
+                    seen.add(pos)
+                    ranked.append(pos)
+        return ranked[:limit] if limit is not None else ranked
+
+    def search(self, query, limit=None):
+        """返回匹配的卡名列表"""
+        return [self.names[pos] for pos in self.search_positions(query, limit)]
+
+    def search_ids(self, query, limit=None):
+        """返回匹配的卡片 id 列表"""
+        return [self.ids[pos] for pos in self.search_positions(query, limit)]
+
+    def resolve(self, query):
+        """
+        把玩家提交的卡名解析成一张卡的 id，找不到返回 None。
+        先查规范化卡名的哈希表；没有完全匹配时取排序后的第一个前缀/子串匹配，
+        同一档内按 id 升序，所以结果是确定的。
+        """
+        key = normalize_name(query)
+        if not key:
+            return None
+        exact = self.exact.get(key)
+        if exact:
+            return self.ids[exact[0]]
+        ranked = self.search_positions(query, limit=1)
+        return self.ids[ranked[0]] if ranked else None
@@ -0,0 +1,138 @@
+import hmac
+import logging
+import os
+import threading
+import time
+
+from flask import abort, jsonify, request
+
+from data_utils import load_card_data, locate_card_database
+
+# 每隔多少秒检查一次 cards.cdb 是否变化，0 表示不检查（只能通过管理接口重新加载）
+WATCH_INTERVAL = float(os.getenv("CARDS_WATCH_INTERVAL", 0))
+# 管理接口的口令，不设置时 /admin/* 一律返回 404
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+logger = logging.getLogger("ccb.reload")
+
+
+def _run_in_os_thread(fn, name):
+    """
+    在真正的系统线程里运行 fn。gevent 打过补丁后 threading.Thread 只是一个协程，
+    CPU 密集的重建（一秒多）会一直占着事件循环、卡住同一进程里的所有请求；
+    这时改用 gevent hub 自带的系统线程池。
+    """
+    try:
+        from gevent import monkey
+    except ImportError:  # 没装 gevent
+        monkey = None
+    if monkey is not None and monkey.is_module_patched("threading"):
+        import gevent
+
+        gevent.get_hub().threadpool.spawn(fn)
+    else:
+        threading.Thread(target=fn, name=name, daemon=True).start()
+
+
+def _fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class Reloader:
+    """
+    在后台线程里重新读取 cards.cdb，建好新的题库、标签表和索引后由 store.rebuild() 一次性替换。
+    重新加载期间请求照常使用旧数据；同一时间只跑一次重新加载。
+
+    “监视文件”不另开常驻线程：每个请求开始时最多每 WATCH_INTERVAL 秒 stat 一次 cards.cdb，
+    发现大小或修改时间变了就启动重新加载。这样 gunicorn fork 出的每个 worker 都会各自发现变化。
+    """
+
+    def __init__(self, store, path=None, interval=WATCH_INTERVAL):
+        self.store = store
+        self.path = locate_card_database(path)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._seen = _fingerprint(self.path)
+        self._next_check = time.monotonic() + interval
+        self.last_reload = None
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def reload(self):
+        """同步重新加载；已有一次在进行时直接返回 False"""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            start = time.perf_counter()
+            fingerprint = _fingerprint(self.path)
+            db, columns = load_card_data(self.path)
+            self.store.rebuild(db, columns)
+            self._seen = fingerprint
+            self.last_reload = time.time()
+            logger.warning("已重新加载 %s：%d 张卡，耗时 %.2fs", self.path, len(db), time.perf_counter() - start)
+            return True
+        except Exception:
+            logger.exception("重新加载 %s 失败，继续使用旧数据", self.path)
+            return False
+        finally:
+            self._lock.release()
+
+    def reload_async(self):
+        """在后台线程里重新加载；已有一次在进行时返回 False"""
+        if self.running:
+            return False
+        _run_in_os_thread(self.reload, "cards-reload")
+        return True
+
+    def check(self):
+        """数据库文件变化时启动后台重新加载（每 interval 秒最多 stat 一次）"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.interval
+        if _fingerprint(self.path) != self._seen:
+            self.reload_async()
+
+
+def _require_admin():
+    if not ADMIN_TOKEN:
+        abort(404)
+    given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(given.encode(), ADMIN_TOKEN.encode()):
+        abort(403)
+
+
+def init_app(app, store, path=None):
+    """
+    挂上文件监视（CARDS_WATCH_INTERVAL > 0 时）和管理接口（设置了 ADMIN_TOKEN 时）：
+      POST /admin/reload   后台重新加载 cards.cdb，立即返回 202（已在加载时 409）
+      POST /admin/hot      请求体为 card_build.py --diff 的输出，增量更新热门卡
+    请求头需带 Authorization: Bearer <ADMIN_TOKEN>。返回 Reloader 实例。
+    """
+    reloader = Reloader(store, path)
+    if reloader.interval > 0:
+        app.before_request(reloader.check)
+
+    def admin_reload():
+        _require_admin()
+        if not reloader.reload_async():
+            return jsonify({"status": "running"}), 409
+        return jsonify({"status": "started"}), 202
+
+    def admin_hot():
+        _require_admin()
+        diff = request.get_json(silent=True) or {}
+        added = [int(i) for i in diff.get("added", ())]
+        removed = [int(i) for i in diff.get("removed", ())]
+        store.apply_hot_diff(added, removed)
+        return jsonify({"status": "ok", "hot": len(store.pool("hot"))})
+
+    app.add_url_rule("/admin/reload", "admin_reload", admin_reload, methods=["POST"])
+    app.add_url_rule("/admin/hot", "admin_hot", admin_hot, methods=["POST"])
+    return reloader
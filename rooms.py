@@ -0,0 +1,255 @@
+import os
+import secrets
+import threading
+import time
+
+from flask import redirect, render_template, request, url_for
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
+from data_utils import COMPARE_FIELDS, DIRECTION_ARROWS, NEAR_THRESHOLDS, VERDICT_CLASSES
+
+# ROOMS=0 时不挂多人对战（多个 sync worker 部署时用）
+ROOMS_ENABLED = os.getenv("ROOMS", "1") == "1"
+# flask-socketio 的并发模型：threading（默认，开发用）| gevent（生产，单进程可挂数千个空闲连接）
+ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+# 设置后（如 redis://localhost:6379/0）通过 redis 把房间广播转发到其他进程
+MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+# 房间空闲多久后回收（秒）
+ROOM_TTL = int(os.getenv("ROOM_TTL", 2 * 3600))
+ROOM_MODES = ('monster', 'spell', 'trap', 'hot', 'all', 'easy', 'hard')
+MAX_NAME_LENGTH = 16
+# 猜测找不到卡时最多给出几个模糊匹配的建议
+DID_YOU_MEAN_LIMIT = 3
+
+
+class Player:
+    __slots__ = ("name", "guess_count", "solved")
+
+    def __init__(self, name):
+        self.name = name
+        self.guess_count = 0
+        self.solved = False
+
+
+class Room:
+    """
+    一个房间：所有玩家猜同一张卡，先猜中的人赢。状态只在内存里，房间内的操作由 lock 串行化。
+    """
+
+    __slots__ = ("code", "mode", "max_attempts", "target_id", "players", "winner", "touched", "lock")
+
+    def __init__(self, code, mode, max_attempts):
+        self.code = code
+        self.mode = mode
+        self.max_attempts = max_attempts
+        self.target_id = None
+        self.players = {}
+        self.winner = None
+        self.touched = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self):
+        """有人猜中，或者所有人都用完了次数"""
+        if self.winner is not None:
+            return True
+        return bool(self.players) and all(
+            p.solved or p.guess_count >= self.max_attempts for p in self.players.values()
+        )
+
+    def snapshot(self):
+        return {
+            "room": self.code,
+            "mode": self.mode,
+            "max_attempts": self.max_attempts,
+            "players": [[p.name, p.guess_count] for p in self.players.values()],
+            "winner": self.winner,
+        }
+
+
+class RoomRegistry:
+    """进程内的房间表，外加 socket 连接 → (房间号, 昵称) 的映射"""
+
+    def __init__(self, ttl=ROOM_TTL):
+        self.ttl = ttl
+        self._rooms = {}
+        self._members = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, code, mode, max_attempts):
+        now = time.monotonic()
+        with self._lock:
+            # 顺便回收长时间没人操作的房间
+            for stale in [c for c, r in self._rooms.items() if now - r.touched > self.ttl]:
+                del self._rooms[stale]
+            room = self._rooms.get(code)
+            if room is None:
+                room = self._rooms[code] = Room(code, mode, max_attempts)
+            room.touched = now
+            return room
+
+    def bind(self, sid, code, name):
+        with self._lock:
+            self._members[sid] = (code, name)
+
+    def member(self, sid):
+        """连接对应的 (房间, 昵称)，没有加入房间时返回 (None, None)"""
+        with self._lock:
+            code, name = self._members.get(sid, (None, None))
+            room = self._rooms.get(code)
+        if room is not None:
+            room.touched = time.monotonic()
+        return room, name
+
+    def unbind(self, sid):
+        with self._lock:
+            code, name = self._members.pop(sid, (None, None))
+            return self._rooms.get(code), name
+
+    def __len__(self):
+        return len(self._rooms)
+
+
+def init_app(app, store):
+    """
+    挂上多人对战：/room（新建房间）、/room/<code>（房间页面）和 socket.io 事件。
+
+    客户端 → 服务端：join {room, name, mode, attempts} / guess {guess} / next / leave
+    服务端 → 客户端：
+      state   房间快照 {room, mode, max_attempts, players, winner}
+      result  只发给猜的人：{id, name, c: 第几次, v: 判定代码, row: 各字段渲染好的 HTML}
+      guess   广播给房间里的其他人：{p: 昵称, c: 第几次, v: 判定代码}（不含卡名，避免剧透）
+      over    {winner, answer}
+      error   {msg}
+    判定代码按 COMPARE_FIELDS 顺序排列，含义见 data_utils 的 V_* / DIR_*。
+    返回 SocketIO 实例。
+    """
+    # 房间事件不读写 Flask 会话；会话已经由 ServerSideSessionInterface 放在服务端，不需要 socketio 再复制一份
+    socketio = SocketIO(app, async_mode=ASYNC_MODE, message_queue=MESSAGE_QUEUE, manage_session=False)
+    registry = RoomRegistry()
+
+    def new_target(room):
+        room.target_id = store.pool(room.mode).sample()
+        room.winner = None
+        for p in room.players.values():
+            p.guess_count = 0
+            p.solved = False
+
+    def finish(room):
+        emit("over", {"winner": room.winner, "answer": store.tags(room.target_id)["卡名"]}, to=room.code)
+
+    def new_room():
+        return redirect(url_for("room_page", code=secrets.token_hex(3)))
+
+    def room_page(code):
+        return render_template(
+            "room.html",
+            code=code,
+            modes=ROOM_MODES,
+            fields=COMPARE_FIELDS,
+            numeric=list(NEAR_THRESHOLDS),
+            classes=VERDICT_CLASSES,
+            arrows=DIRECTION_ARROWS,
+        )
+
+    app.add_url_rule("/room", "new_room", new_room)
+    app.add_url_rule("/room/<code>", "room_page", room_page)
+
+    def drop(sid):
+        """把连接从它所在的房间里移除（没有加入房间时什么也不做）"""
+        room, name = registry.unbind(sid)
+        if room is None:
+            return
+        with room.lock:
+            room.players.pop(name, None)
+            leave_room(room.code, sid=sid)
+            emit("state", room.snapshot(), to=room.code)
+            if room.players and room.winner is None and room.finished:
+                finish(room)
+
+    @socketio.on("join")
+    def on_join(data):
+        code = str(data.get("room", ""))[:32]
+        name = str(data.get("name", "")).strip()[:MAX_NAME_LENGTH]
+        if not code or not name:
+            emit("error", {"msg": "需要房间号和昵称"})
+            return
+        mode = data.get("mode") if data.get("mode") in ROOM_MODES else 'hot'
+        try:
+            max_attempts = min(max(int(data.get("attempts", 8)), 1), 20)
+        except (TypeError, ValueError):
+            max_attempts = 8
+
+        # 同一个连接再次 join 时先离开原来的房间，否则旧房间里留下的玩家会让它永远结束不了
+        drop(request.sid)
+        room = registry.get_or_create(code, mode, max_attempts)
+        with room.lock:
+            if name in room.players:
+                emit("error", {"msg": "这个昵称已经有人用了"})
+                return
+            room.players[name] = Player(name)
+            if room.target_id is None:
+                new_target(room)
+            registry.bind(request.sid, code, name)
+            join_room(code)
+            emit("state", room.snapshot(), to=code)
+
+    @socketio.on("guess")
+    def on_guess(data):
+        room, name = registry.member(request.sid)
+        if room is None:
+            emit("error", {"msg": "还没有加入房间"})
+            return
+        with room.lock:
+            player = room.players.get(name)
+            if player is None or room.finished or player.solved:
+                return
+            if player.guess_count >= room.max_attempts:
+                emit("error", {"msg": "猜测次数已用完"})
+                return
+            query = str(data.get("guess", "")).strip()
+            guess_id = store.resolve(room.mode, query)
+            if guess_id is None:
+                # 模糊匹配只作为建议，不替玩家猜
+                suggestions = store.did_you_mean(room.mode, query, DID_YOU_MEAN_LIMIT)
+                maybe = f"，你是不是要找：{' / '.join(suggestions)}？" if suggestions else ""
+                emit("error", {"msg": "没有找到这张卡" + maybe})
+                return
+            player.guess_count += 1
+            verdicts = store.verdicts(guess_id, room.target_id)
+            codes = [verdicts[key] for key in COMPARE_FIELDS]
+            html = store.compare(guess_id, room.target_id)
+            emit("result", {
+                "id": guess_id,
+                "name": store.tags(guess_id)["卡名"],
+                "c": player.guess_count,
+                "v": codes,
+                "row": [html[key] for key in COMPARE_FIELDS],
+            })
+            emit("guess", {"p": name, "c": player.guess_count, "v": codes}, to=room.code, include_self=False)
+            if guess_id == room.target_id:
+                player.solved = True
+                room.winner = name
+            if room.finished:
+                finish(room)
+
+    @socketio.on("next")
+    def on_next():
+        room, _ = registry.member(request.sid)
+        if room is None:
+            return
+        with room.lock:
+            if not room.finished:
+                return
+            new_target(room)
+            emit("state", room.snapshot(), to=room.code)
+
+    @socketio.on("leave")
+    def on_leave():
+        drop(request.sid)
+
+    @socketio.on("disconnect")
+    def on_disconnect(*args):
+        drop(request.sid)
+
+    return socketio
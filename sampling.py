@@ -0,0 +1,154 @@
+import hashlib
+import os
+import random
+import secrets
+
+import numpy as np
+
+# 抽题方式
+POLICIES = ("uniform", "weighted", "stratified", "norepeat")
+# weighted：热门卡的权重是普通卡的多少倍
+HOT_WEIGHT = float(os.getenv("SAMPLE_HOT_WEIGHT", 4))
+# stratified：为了换一个分层最多重抽几次，题库只有一个分层时自然退化为均匀抽取
+STRATUM_RETRIES = 8
+# norepeat：带密钥排列的 Feistel 轮数
+FEISTEL_ROUNDS = 4
+
+
+class AliasTable:
+    """
+    Walker / Vose 别名表：O(n) 建表，之后每次按权重抽取只需一次均匀随机数和一次比较。
+    """
+
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights):
+        w = np.asarray(weights, dtype=np.float64)
+        n = len(w)
+        total = w.sum()
+        scaled = w * n / total if total > 0 else np.ones(n)
+        prob = np.ones(n)
+        alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        scaled = scaled.tolist()
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        self.prob = prob.tolist()
+        self.alias = alias.tolist()
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng=random):
+        """返回一个下标"""
+        u = rng.random() * len(self.prob)
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+
+def pool_weights(frame):
+    """weighted 抽题的权重：普通卡 1、热门卡 HOT_WEIGHT"""
+    return 1.0 + (HOT_WEIGHT - 1.0) * (np.asarray(frame["hot"]) == 1)
+
+
+def stratum_keys(frame):
+    """分层键：卡片大类（怪兽/魔法/陷阱）× 属性 × 等级"""
+    card_type = np.asarray(frame["type"]).astype(np.int64)
+    kind = card_type & 0x7
+    level = np.asarray(frame["level"]).astype(np.int64) & 0xff
+    attribute = np.asarray(frame["attribute"]).astype(np.int64)
+    return (kind << 40) | (attribute << 8) | level
+
+
+class Strata:
+    """
+    按 stratum_keys() 分组的题库：先按分层大小用别名表抽一个分层，再在层内均匀抽一张
+    （不考虑重抽时每张卡概率相同）；抽到与上一题同一分层时重抽，让相邻两局的卡差别更大。
+    """
+
+    __slots__ = ("members", "of", "table")
+
+    def __init__(self, keys):
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.cumsum(counts)[:-1]
+        self.members = [m.tolist() for m in np.split(order, bounds)]
+        self.of = inverse.tolist()
+        self.table = AliasTable(counts)
+
+    def draw(self, rng=random, avoid=None):
+        """返回一个下标；avoid 为上一题的下标"""
+        skip = self.of[avoid] if avoid is not None else None
+        for _ in range(STRATUM_RETRIES):
+            s = self.table.draw(rng)
+            if s != skip:
+                break
+        members = self.members[s]
+        return members[rng.randrange(len(members))]
+
+
+def new_permutation(n):
+    """
+    [n, key, cursor]：每个玩家一个随机的 64 位密钥，permute(key, n, cursor) 依次给出 0..n-1 的一个排列，
+    只需存这三个整数就能在整个题库抽完之前不重复。密钥只在服务端会话里，看到前几题也推不出后面的顺序。
+    """
+    return [n, secrets.randbits(64), 0]
+
+
+def permute(key, n, k):
+    """
+    带密钥的 0..n-1 上的排列：在 2^(2h) ≥ n 的定义域上做 FEISTEL_ROUNDS 轮 Feistel 变换
+    （轮函数为带密钥的 BLAKE2b），结果落在 n 以外时继续变换（cycle walking），直到回到 0..n-1。
+    定义域不超过 4n，平均变换不到 4 次。n 必须是正数（空集合上没有排列，cycle walking 会停不下来）。
+    """
+    if n <= 0:
+        raise ValueError(f"permute 需要 n > 0，收到 {n}")
+    half = max(1, ((n - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    key = key.to_bytes(8, "little")
+    x = k
+    while True:
+        left, right = x >> half, x & mask
+        for r in range(FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(right.to_bytes(8, "little") + bytes((r,)), key=key, digest_size=8).digest()
+            left, right = right, left ^ (int.from_bytes(digest, "little") & mask)
+        x = (left << half) | right
+        if x < n:
+            return x
+
+
+def draw_target(pool, state, rng=random):
+    """
+    按 state.policy 从题库里抽一张目标卡，返回卡片 id；题库为空时返回 None。
+    norepeat 会更新 state.perm；上一题（state.previous_id）用于 stratified 换层。
+    """
+    if not len(pool):
+        return None
+    policy = state.policy
+    if policy == "weighted":
+        return int(pool.ids[pool.weights.draw(rng)])
+
+    if policy == "stratified":
+        avoid = None
+        prev = state.previous_id
+        if prev is not None and prev in pool:
+            avoid = int(np.searchsorted(pool.ids, prev))
+        return int(pool.ids[pool.strata.draw(rng, avoid)])
+
+    if policy == "norepeat":
+        n = len(pool)
+        perm = state.perm
+        # 题库变了（换题库 / 重新加载后大小不同）或者已经抽完一轮时换一个新密钥
+        if not perm or perm[0] != n or perm[2] >= n:
+            perm = new_permutation(n)
+        _, key, cursor = perm
+        state.perm = [n, key, cursor + 1]
+        return int(pool.ids[permute(key, n, cursor)])
+
+    return pool.sample(rng)
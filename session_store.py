@@ -0,0 +1,166 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from metrics import stage
+
+# 会话空闲多久后过期（秒）
+SESSION_TTL = int(os.getenv("SESSION_TTL", 6 * 3600))
+# 进程内会话最多保留多少个，超出后淘汰最久未访问的
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 100_000))
+
+
+class MemorySessionStore:
+    """进程内 LRU + TTL 会话存储，默认后端；多 worker 部署时每个进程各有一份"""
+
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            expires, data = item
+            if expires < now:
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            # 返回副本，请求里修改不会直接影响存储
+            return json.loads(data)
+
+    def set(self, sid, data):
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._data[sid] = (time.monotonic() + self.ttl, payload)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisSessionStore:
+    """基于 redis 的会话存储，多个 worker / 多台机器共享同一份会话"""
+
+    def __init__(self, url, ttl=SESSION_TTL, prefix="ccb:session:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, sid):
+        payload = self.client.get(self.prefix + sid)
+        return json.loads(payload) if payload is not None else None
+
+    def set(self, sid, data):
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self.client.setex(self.prefix + sid, self.ttl, payload)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+def session_backend():
+    """
+    按环境变量选择会话后端：
+      SESSION_BACKEND=memory | redis，不设置时配置了 REDIS_URL 就用 redis，否则用 memory
+      REDIS_URL=redis://localhost:6379/0
+    """
+    return os.getenv("SESSION_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "memory")
+
+
+def make_session_store():
+    """按 session_backend() 建会话存储"""
+    backend = session_backend()
+    if backend == "redis":
+        return RedisSessionStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"未知的 SESSION_BACKEND：{backend}")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    会话内容保存在服务端，cookie 里只放一个签名过的会话 id。
+    视图代码照常读写 flask.session，不需要改动。
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="ccb-session")
+
+    def open_session(self, app, request):
+        with stage("session_load"):
+            return self._open_session(app, request)
+
+    def _open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        refresh = session.permanent and app.config["SESSION_REFRESH_EACH_REQUEST"]
+        if session.modified or refresh:
+            with stage("session_save"):
+                self.store.set(session.sid, dict(session))
+        # 会话 id 不变，cookie 只在新建会话（或需要续期）时下发
+        if session.new or refresh:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
@@ -0,0 +1,113 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# 系列码按基础系列（低 12 位）散列到这么多个桶，同一系列的卡落在同一维
+SET_BUCKETS = 64
+# 缓存多少张目标卡到全库的距离（每张约 4 * 卡片数 字节）
+DISTANCE_CACHE_SIZE = int(os.getenv("DISTANCE_CACHE_SIZE", 256))
+# 各组特征的权重：布尔矩阵每个置位贡献 权重²，数值按 1000 攻守 / 4 星 折成 1
+FEATURE_WEIGHTS = {
+    "type": 1.0,
+    "race": 1.0,
+    "attribute": 1.0,
+    "category": 0.5,
+    "arrows": 0.5,
+    "setcode": 1.5,
+    "stats": 1.0,
+}
+
+
+def feature_matrix(db, columns):
+    """
+    每张卡一行 float32 特征，行顺序与 db 一致：
+    类型 / 种族 / 属性 / 效果标签 / 箭头的布尔矩阵、散列后的系列、攻击 / 守备 / 等级 / 刻度。
+    全部来自 decode_card_columns() 的矩阵，整表一次向量化构建。
+    """
+    n = len(db)
+    parts = [
+        np.asarray(columns[key], dtype=np.float32) * FEATURE_WEIGHTS[key]
+        for key in ("type", "race", "attribute", "category", "arrows")
+    ]
+
+    codes = np.asarray(columns["setcode"]).astype(np.int64)
+    rows, cols = np.nonzero(codes)
+    sets = np.zeros((n, SET_BUCKETS), dtype=np.float32)
+    sets[rows, (codes[rows, cols] & 0xFFF) % SET_BUCKETS] = FEATURE_WEIGHTS["setcode"]
+    parts.append(sets)
+
+    is_link = np.asarray(columns["is_link"], dtype=bool)
+    # “?” 攻守在数据库里是负数，按 0 处理；连接怪兽的守备位存的是箭头
+    atk = np.clip(np.asarray(db["atk"]), 0, None) / 1000
+    defense = np.where(is_link, 0, np.clip(np.asarray(db["def"]), 0, None)) / 1000
+    stats = np.column_stack([atk, defense, np.asarray(columns["rank"]) / 4, np.asarray(columns["scale"]) / 4])
+    parts.append(stats.astype(np.float32) * FEATURE_WEIGHTS["stats"])
+    return np.ascontiguousarray(np.hstack(parts))
+
+
+class SimilarityIndex:
+    """
+    卡片相似度：特征向量之间的欧氏距离。
+
+    加载时只建特征矩阵和行范数（毫秒级）；某张目标卡到全库的距离在第一次用到时
+    一次矩阵-向量乘法算出（亚毫秒），按目标卡缓存，同一局后续的“接近度”和近邻查询都是查表。
+    全库两两距离表建一次要几秒，重新加载时也要重建，所以不预先算。
+    """
+
+    def __init__(self, db, columns):
+        self.ids = np.asarray(db.index)
+        self._rows = {card_id: row for row, card_id in enumerate(self.ids.tolist())}
+        self.features = feature_matrix(db, columns)
+        self.sq_norms = np.einsum("ij,ij->i", self.features, self.features)
+        self._distances = lru_cache(maxsize=DISTANCE_CACHE_SIZE)(self._compute_distances)
+
+    def _compute_distances(self, row):
+        d = self.sq_norms + self.sq_norms[row] - 2 * (self.features @ self.features[row])
+        np.maximum(d, 0, out=d)
+        d[row] = 0
+        d.setflags(write=False)
+        return d
+
+    def distances(self, target_id):
+        """目标卡到每张卡的距离平方（与 db 行顺序一致，只读），目标卡不在数据库里时返回 None"""
+        row = self._rows.get(target_id)
+        return None if row is None else self._distances(row)
+
+    def warmth(self, guess_id, target_id, mask=None):
+        """
+        猜测有多接近答案：题库（mask，None 为全库）里离答案比这次猜测更远的卡占多少，0~1，猜中为 1。
+        任一张卡不在数据库里时返回 None。
+        """
+        d = self.distances(target_id)
+        g = self._rows.get(guess_id)
+        if d is None or g is None:
+            return None
+        if guess_id == target_id:
+            return 1.0
+        farther = d > d[g]
+        total = len(d) if mask is None else int(np.count_nonzero(mask))
+        if mask is not None:
+            farther &= mask
+        return float(np.count_nonzero(farther)) / max(total - 1, 1)
+
+    def nearest_rows(self, target_id, k=10, mask=None):
+        """题库里离目标卡最近的 k 张卡（不含它自己）的行号，由近到远"""
+        d = self.distances(target_id)
+        if d is None:
+            return np.empty(0, dtype=np.int64)
+        d = d.copy()
+        d[self._rows[target_id]] = np.inf
+        if mask is not None:
+            d[~mask] = np.inf
+        k = min(k, int(np.count_nonzero(np.isfinite(d))))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.argpartition(d, k - 1)[:k]
+        return rows[np.argsort(d[rows], kind="stable")]
+
+    def nearest_mask(self, target_id, k=10, mask=None):
+        """nearest_rows 的布尔掩码形式，和其他掩码直接相与"""
+        out = np.zeros(len(self.ids), dtype=bool)
+        out[self.nearest_rows(target_id, k, mask)] = True
+        return out
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# snapshot.py — 把处理好的卡表写成列式快照，服务启动时直接内存映射
+
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from card_table import COLUMN_DTYPES, CardTable
+
+SNAPSHOT_VERSION = 3
+# datas/texts 合并去重后保留的列，与 load_card_database() 的列一致；
+# 按 CardTable 的存储类型写入，加载时直接 mmap，不再转换
+COLUMNS = list(COLUMN_DTYPES)
+
+
+def snapshot_dir_for(db_file):
+    """cards.cdb 对应的快照目录：同目录下的 cards.snapshot/"""
+    db_file = Path(db_file)
+    return db_file.with_suffix(".snapshot")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_fingerprint(db_file, with_hash=True):
+    stat = Path(db_file).stat()
+    fp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        fp["sha256"] = file_sha256(db_file)
+    return fp
+
+
+def write_snapshot(df, db_file, columns=None, out_dir=None):
+    """
+    把 CardTable 或 load_card_database() 的结果（以及 decode_card_columns 的解码矩阵）
+    写成一组 .npy 文件 + meta.json。先写到临时目录再改名，避免读到半成品。
+    """
+    out_dir = Path(out_dir) if out_dir else snapshot_dir_for(db_file)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp_dir.exists():
+        _remove_dir(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    np.save(tmp_dir / "id.npy", np.asarray(df.index).astype(np.int32))
+    for col in COLUMNS:
+        np.save(tmp_dir / f"{col}.npy", np.asarray(df[col]).astype(COLUMN_DTYPES[col]))
+    # 定长 unicode 数组可以直接 mmap，不需要逐条解码
+    np.save(tmp_dir / "name.npy", np.array(list(df["name"]), dtype=str))
+
+    decoded = []
+    for key, arr in (columns or {}).items():
+        np.save(tmp_dir / f"decoded.{key}.npy", np.ascontiguousarray(arr))
+        decoded.append(key)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "rows": int(len(df)),
+        "columns": COLUMNS,
+        "decoded": decoded,
+        "source": source_fingerprint(db_file),
+    }
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    if out_dir.exists():
+        _remove_dir(out_dir)
+    tmp_dir.rename(out_dir)
+    return out_dir
+
+
+def _remove_dir(path):
+    for child in path.iterdir():
+        child.unlink()
+    path.rmdir()
+
+
+def read_meta(snap_dir):
+    meta_file = Path(snap_dir) / "meta.json"
+    if not meta_file.exists():
+        return None
+    try:
+        return json.loads(meta_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(meta, db_file):
+    """
+    判断快照是否对应当前的 cards.cdb：
+    大小和修改时间都没变就直接认为新鲜；修改时间变了（例如 PyInstaller
+    解压到临时目录）再比较 sha256，内容一致同样算新鲜。
+    """
+    if not meta or meta.get("version") != SNAPSHOT_VERSION:
+        return False
+    recorded = meta.get("source", {})
+    current = source_fingerprint(db_file, with_hash=False)
+    if current["size"] != recorded.get("size"):
+        return False
+    if current["mtime_ns"] == recorded.get("mtime_ns"):
+        return True
+    return file_sha256(db_file) == recorded.get("sha256")
+
+
+def load_snapshot(db_file, snap_dir=None):
+    """
+    快照新鲜时返回 (CardTable, columns)，否则返回 None。
+    数组以 mmap 方式打开，多个进程加载同一份快照时共享页缓存。
+    """
+    snap_dir = Path(snap_dir) if snap_dir else snapshot_dir_for(db_file)
+    meta = read_meta(snap_dir)
+    if not is_fresh(meta, db_file):
+        return None
+
+    load = lambda name: np.load(snap_dir / f"{name}.npy", mmap_mode="r")
+    data = {col: load(col) for col in meta["columns"]}
+    table = CardTable.from_arrays(load("id"), load("name").tolist(), data)
+    columns = {key: load(f"decoded.{key}") for key in meta["decoded"]} or None
+    return table, columns
+
+
+def main():
+    from data_utils import decode_card_columns, locate_card_database, read_card_table
+
+    db_file = locate_card_database(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"🔄 读取数据库：{db_file}")
+    t0 = time.perf_counter()
+    df = read_card_table(db_file)
+    t1 = time.perf_counter()
+    out_dir = write_snapshot(df, db_file, decode_card_columns(df))
+    t2 = time.perf_counter()
+    print(f"✅ 已写入快照：{out_dir}（{len(df)} 张卡）")
+
+    t3 = time.perf_counter()
+    load_snapshot(db_file, out_dir)
+    t4 = time.perf_counter()
+    print(f"⏱ SQLite 加载 {(t1 - t0) * 1e3:.1f}ms，写快照 {(t2 - t1) * 1e3:.1f}ms，"
+          f"从快照加载 {(t4 - t3) * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import numpy as np
+
+from data_utils import DIR_DOWN, DIR_UP, NEAR_THRESHOLDS, V_GRAY, V_GREEN, V_PARTIAL, V_RED, V_YELLOW
+from game_state import HINT_ATTR, HINT_CHAR, HINT_SET, HINT_TAG
+from map import CATEGORY_TAGS, SETNAME_MAP
+
+# 效果标签编号 → decode_category_matrix 的列号
+CATEGORY_COLUMNS = {code: col for col, code in enumerate(CATEGORY_TAGS)}
+# 系列名 → 对应的系列码（个别系列名对应多个码）
+SETNAME_CODES = {}
+for _code, _name in SETNAME_MAP.items():
+    SETNAME_CODES.setdefault(_name, []).append(_code)
+
+
+def _numeric_mask(guess_value, values, threshold, verdict):
+    """数值字段：候选卡与猜测对比后得到同样的 (判定, 方向)"""
+    code, direction = verdict
+    diff = np.abs(values - guess_value)
+    if code == V_GREEN:
+        return diff == 0
+    near = diff <= threshold
+    mask = (diff != 0) & (near if code == V_YELLOW else ~near)
+    if direction == DIR_UP:
+        mask &= values > guess_value
+    elif direction == DIR_DOWN:
+        mask &= values < guess_value
+    return mask
+
+
+def _optional_numeric_mask(guess_empty, guess_value, values, empty, threshold, verdict):
+    """可能为空的数值字段（连接怪兽的守备、非灵摆的刻度），空值规则见 compare_field"""
+    if guess_empty:
+        return empty if verdict == V_GRAY else ~empty
+    if verdict == V_PARTIAL:
+        return empty.copy()
+    return ~empty & _numeric_mask(guess_value, values, threshold, verdict)
+
+
+class CandidateSolver:
+    """
+    根据已有的对比结果反推答案：一张卡与每次猜测对比后的判定都和实际结果相同，它就仍然可能是答案。
+
+    所有约束都在 decode_card_columns() 预先解码好的列上做向量运算，结果是与 db 行顺序一致的布尔掩码，
+    和 CardPool.mask 相与就限定到某个题库。判定规则与 data_utils.compare_field 一一对应：
+      卡名 / 属性 / 种族：相等与否
+      攻击 / 守备 / 等级 / 刻度：差值是否为 0、是否在 NEAR_THRESHOLDS 以内，以及方向
+      类型 / 效果标签 / 系列 / 箭头：猜测卡的每一项在候选卡里有没有
+    """
+
+    def __init__(self, db, columns):
+        self.ids = np.asarray(db.index)
+        self._rows = {card_id: row for row, card_id in enumerate(self.ids.tolist())}
+        self.names = db["name"].tolist()
+        codes = {}
+        self.name_codes = np.array([codes.setdefault(n, len(codes)) for n in self.names], dtype=np.int32)
+        self.atk = np.asarray(db["atk"]).astype(np.int64)
+        self.defense = np.asarray(db["def"]).astype(np.int64)
+        self.attribute = np.asarray(db["attribute"])
+        self.race = np.asarray(db["race"])
+        self.rank = np.array(columns["rank"], dtype=np.int64)
+        self.scale = np.array(columns["scale"], dtype=np.int64)
+        self.is_link = np.array(columns["is_link"], dtype=bool)
+        self.not_pendulum = ~np.array(columns["is_pendulum"], dtype=bool)
+        # 按列取用，存成列优先，每一列在内存里是连续的
+        self.type = np.asfortranarray(columns["type"])
+        self.category = np.asfortranarray(columns["category"])
+        self.arrows = np.asfortranarray(columns["arrows"])
+        self.setcode = [np.ascontiguousarray(col) for col in np.asarray(columns["setcode"]).T]
+        self._char_masks = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, card_id):
+        """卡片 id → db 里的行号，不在当前数据库里（已被删除）时返回 None"""
+        return self._rows.get(card_id)
+
+    def setname_mask(self, name):
+        """系列里含有 name 的卡"""
+        mask = np.zeros(len(self), dtype=bool)
+        for code in SETNAME_CODES.get(name, ()):
+            for col in self.setcode:
+                mask |= col == code
+        return mask
+
+    def char_mask(self, ch):
+        """卡名里含有 ch 这个字的卡（按字缓存）"""
+        mask = self._char_masks.get(ch)
+        if mask is None:
+            mask = self._char_masks[ch] = np.fromiter((ch in n for n in self.names), bool, len(self.names))
+        return mask
+
+    def guess_mask(self, guess_id, verdicts, tags):
+        """
+        与一次猜测的判定结果相容的卡。verdicts 为 compare_cards 的结果，tags 为猜测卡的标签。
+        猜测卡已不在数据库里时不加约束。
+        """
+        g = self.row_of(guess_id)
+        if g is None:
+            return np.ones(len(self), dtype=bool)
+
+        mask = (self.name_codes == self.name_codes[g]) if verdicts["卡名"] == V_GREEN else (self.name_codes != self.name_codes[g])
+        mask &= _numeric_mask(self.atk[g], self.atk, NEAR_THRESHOLDS["攻击"], verdicts["攻击"])
+        mask &= _optional_numeric_mask(
+            self.is_link[g], self.defense[g], self.defense, self.is_link, NEAR_THRESHOLDS["守备"], verdicts["守备"]
+        )
+        mask &= _numeric_mask(self.rank[g], self.rank, NEAR_THRESHOLDS["等级/阶级"], verdicts["等级/阶级"])
+        mask &= _optional_numeric_mask(
+            self.not_pendulum[g], self.scale[g], self.scale, self.not_pendulum, NEAR_THRESHOLDS["刻度"], verdicts["刻度"]
+        )
+        mask &= (self.attribute == self.attribute[g]) if verdicts["属性"] == V_GREEN else (self.attribute != self.attribute[g])
+        mask &= (self.race == self.race[g]) if verdicts["种族"] == V_GREEN else (self.race != self.race[g])
+
+        # 列表字段：猜测卡的第 k 项对应矩阵里第 k 个置位的列
+        for matrix, key in ((self.type, "类型"), (self.category, "效果标签")):
+            for col, code in zip(np.flatnonzero(matrix[g]).tolist(), verdicts[key]):
+                mask &= matrix[:, col] if code == V_GREEN else ~matrix[:, col]
+        if self.is_link[g] and self.arrows[g].any():
+            for col, code in enumerate(verdicts["箭头"]):
+                if code == V_GREEN:
+                    mask &= self.arrows[:, col]
+                elif code == V_RED:
+                    mask &= ~self.arrows[:, col]
+        for name, code in zip(tags["系列"], verdicts["系列"]):
+            has = self.setname_mask(name)
+            mask &= has if code == V_GREEN else ~has
+        return mask
+
+    def hint_mask(self, kind, value):
+        """与一条已给出的提示相容的卡（见 game_state 的 HINT_*）"""
+        if kind == HINT_TAG:
+            return self.category[:, CATEGORY_COLUMNS[value]]
+        if kind == HINT_CHAR:
+            return self.char_mask(value)
+        if kind == HINT_SET:
+            return self.setname_mask(value)
+        if kind == HINT_ATTR:
+            return self.attribute == value
+        return np.ones(len(self), dtype=bool)
+
+    def consistent(self, observations, hints=(), base=None):
+        """
+        observations：[(guess_id, verdicts, guess_tags), ...]；hints：[(种类, 值), ...]；
+        base：题库掩码（None 表示全库）。返回仍可能是答案的卡的布尔掩码。
+        """
+        mask = np.ones(len(self), dtype=bool) if base is None else base.copy()
+        for guess_id, verdicts, tags in observations:
+            mask &= self.guess_mask(guess_id, verdicts, tags)
+        for kind, value in hints:
+            mask &= self.hint_mask(kind, value)
+        return mask
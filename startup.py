@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# STARTUP_REPORT=1 时在卡片数据第一次加载完后把分阶段耗时打印到 stderr
+STARTUP_REPORT = os.getenv("STARTUP_REPORT", "0") == "1"
+
+_phases = []
+_finished = False
+
+
+def record(name, seconds):
+    """记一个阶段的耗时；首次加载结束（finish()）之后再调用不再记录，重新加载不会混进来"""
+    if not _finished:
+        _phases.append((name, seconds))
+
+
+@contextmanager
+def phase(name):
+    """with phase("sqlite_read"): ... 记录这段代码的耗时"""
+    if _finished:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def phases():
+    """[(阶段, 秒), ...]，按发生顺序"""
+    return list(_phases)
+
+
+def report():
+    """分阶段耗时表（文本）"""
+    total = sum(seconds for _, seconds in _phases)
+    width = max((len(name) for name, _ in _phases), default=0)
+    lines = [f"{name:<{width}}  {seconds * 1000:8.1f} ms  {seconds / total:6.1%}" for name, seconds in _phases]
+    lines.append(f"{'total':<{width}}  {total * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+def finish():
+    """首次加载完成：停止记录，STARTUP_REPORT=1 时打印报告"""
+    global _finished
+    if _finished:
+        return
+    _finished = True
+    if STARTUP_REPORT and _phases:
+        print("启动耗时：\n" + report(), file=sys.stderr)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# worker_rss.py — 查看 gunicorn master 与各 worker 的内存占用（仅 Linux）
+#
+#   python worker_rss.py              # 从 gunicorn.conf.py 的 pidfile 读取 master pid
+#   python worker_rss.py 12345        # 直接指定 master pid
+#
+# RSS 会把共享页重复计入每个进程；PSS 按共享进程数均摊，
+# Private 才是每个 worker 独占的部分。写时复制生效时，
+# worker 的 Private 应该远小于 master 预加载的数据量，且不随 worker 数增长。
+
+import os
+import sys
+from pathlib import Path
+
+DEFAULT_PIDFILE = os.environ.get("GUNICORN_PIDFILE", "/tmp/yugioh-ccb.pid")
+
+
+def read_memory(pid):
+    """从 /proc/<pid>/smaps_rollup 读取 RSS/PSS/共享/独占（单位 kB）"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def child_pids(ppid):
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # 第 2 个字段是括号包住的进程名，可能含空格，从右侧的 ')' 之后再分割
+            rest = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(rest[1]) == ppid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+def main():
+    if len(sys.argv) > 1:
+        master = int(sys.argv[1])
+    else:
+        master = int(Path(DEFAULT_PIDFILE).read_text().strip())
+
+    rows = [("master", master)] + [("worker", pid) for pid in child_pids(master)]
+    print(f"{'role':<8}{'pid':>8}{'RSS(MB)':>10}{'PSS(MB)':>10}{'Shared(MB)':>12}{'Private(MB)':>13}")
+    total_pss = 0
+    for role, pid in rows:
+        mem = read_memory(pid)
+        total_pss += mem["pss"]
+        print(f"{role:<8}{pid:>8}{mem['rss'] / 1024:>10.1f}{mem['pss'] / 1024:>10.1f}"
+              f"{mem['shared'] / 1024:>12.1f}{mem['private'] / 1024:>13.1f}")
+    print(f"合计 PSS：{total_pss / 1024:.1f} MB（{len(rows) - 1} 个 worker）")
+
+
+if __name__ == "__main__":
+    main()